@@ -0,0 +1,57 @@
+"""
+Compare two benchmark reports from run.py and flag regressions:
+
+    python benchmarks/compare.py base.json head.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def result_key(result: dict) -> tuple:
+    return (result["name"], result.get("member"), result.get("workers"))
+
+
+def compare(base: dict, head: dict, threshold: float) -> list:
+    """
+    Rows of (key, base median, head median, relative change) for benchmarks
+    present in both reports
+    """
+    base_results = {result_key(r): r for r in base["results"]}
+    rows = []
+    for result in head["results"]:
+        before = base_results.get(result_key(result))
+        if before is None or not before["median_wall_s"]:
+            continue
+        change = result["median_wall_s"] / before["median_wall_s"] - 1
+        rows.append(
+            {
+                "benchmark": result_key(result),
+                "base_s": before["median_wall_s"],
+                "head_s": result["median_wall_s"],
+                "change": round(change, 4),
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    rows = compare(base, head, args.threshold)
+    print(json.dumps(rows, indent=2, default=str))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Time the hot paths against synthetic archives served from a local S3
+stand-in (moto server) and write machine-readable JSON:
+
+    python benchmarks/run.py --output bench.json --repeat 3 \\
+        --features 5000 --vertices 100 --raster-size 4096 4096
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import pathlib as pl
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from synthetic import ArchiveSpec, build_archive
+
+REPO = pl.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO / "ffrdcat"))
+
+BUCKET = "ffrdcat-bench"
+PREFIX = "bench"
+PROJECT = "bench"
+
+# GDAL reaches the stand-in over plain http with path-style addressing
+GDAL_CONFIG = {"AWS_HTTPS": "NO", "AWS_VIRTUAL_HOSTING": "FALSE"}
+
+
+def start_s3_stand_in(port: int):
+    """
+    Threaded moto server with credentials and the endpoint exported, before
+    any shared client is created
+    """
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    os.environ.update(
+        {
+            "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "FFRDCAT_S3_ENDPOINT_URL": f"http://127.0.0.1:{port}",
+        }
+    )
+    return server
+
+
+def timed(name: str, fn, repeat: int = 1, **tags) -> dict:
+    """
+    Wall and CPU seconds of `repeat` calls; the last return value is kept
+    in `value` for the caller
+    """
+    wall, cpu = [], []
+    for _ in range(repeat):
+        started, started_cpu = time.perf_counter(), time.process_time()
+        value = fn()
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - started_cpu)
+    logging.info(f"bench | {name}: median {statistics.median(wall):.3f}s")
+    return {
+        "name": name,
+        **tags,
+        "repeat": repeat,
+        "wall_s": [round(w, 6) for w in wall],
+        "cpu_s": [round(c, 6) for c in cpu],
+        "median_wall_s": round(statistics.median(wall), 6),
+        "min_wall_s": round(min(wall), 6),
+        "median_cpu_s": round(statistics.median(cpu), 6),
+        "value": value,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPO, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def bench_archive(key: str, repeat: int, workers: int) -> list:
+    from stores.clients import fiona_session, s3_filesystem
+    from stores.gdal_env import enter_gdal_env
+    from stores.uploads import UploadBuffer
+    from stores.zips import S3Zip, item_from_member, new_collection_from_zip
+
+    fs, sess = s3_filesystem(), fiona_session()
+    enter_gdal_env(GDAL_CONFIG, sess)
+    results = []
+
+    scan = timed("S3Zip", lambda: S3Zip(BUCKET, key, fs), repeat, archive=key)
+    z = scan.pop("value")
+    results.append(scan)
+
+    collection_id = str(uuid.uuid4())
+    tasks = [("vector", f) for f in z.shapefiles] + [("raster", f) for f in z.rasters]
+    projection = None
+    for kind, member in tasks:
+        result = timed(
+            f"item_from_member:{kind}",
+            lambda: item_from_member(
+                PROJECT, z, collection_id, sess, kind, member, uploader=UploadBuffer()
+            ),
+            repeat,
+            archive=key,
+            member=member,
+        )
+        built = result.pop("value")
+        if built is not None and built[1] is not None:
+            projection = projection or built[1]
+        results.append(result)
+
+    for model in z.ras_models:
+        result = timed(
+            "item_from_member:ras_model",
+            lambda: item_from_member(
+                PROJECT,
+                z,
+                collection_id,
+                sess,
+                "ras_model",
+                model,
+                projection,
+                uploader=UploadBuffer(),
+            ),
+            repeat,
+            archive=key,
+            member=model,
+        )
+        result.pop("value")
+        results.append(result)
+
+    result = timed(
+        "new_collection_from_zip",
+        lambda: new_collection_from_zip(
+            PROJECT,
+            z,
+            collection_id,
+            key,
+            sess,
+            workers=workers,
+            uploader=UploadBuffer(),
+        ),
+        repeat,
+        archive=key,
+        workers=workers,
+    )
+    result["items"] = len(list(result.pop("value").get_items()))
+    results.append(result)
+    return results
+
+
+def bench_fgdb(key: str, repeat: int) -> list:
+    from stores.clients import fiona_session
+    from stores.zips import ZippedFGDB
+
+    sess = fiona_session()
+    fgdb = ZippedFGDB(BUCKET, key, sess)
+    result = timed(
+        "ZippedFGDB.process_fgdb",
+        lambda: fgdb.process_fgdb(PROJECT, str(uuid.uuid4()), sess),
+        repeat,
+        archive=key,
+        layers=len(fgdb.contents),
+    )
+    result.pop("value")
+    return [result]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", default="-", help="JSON path, `-` for stdout")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layers", type=int, default=1, help="per geometry type")
+    parser.add_argument("--features", type=int, default=1000)
+    parser.add_argument("--vertices", type=int, default=50)
+    parser.add_argument("--rasters", type=int, default=1)
+    parser.add_argument("--raster-size", type=int, nargs=2, default=[2048, 2048])
+    parser.add_argument("--ras-models", type=int, default=1)
+    parser.add_argument("--fgdb-layers", type=int, default=0)
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--workdir", default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    spec = ArchiveSpec(
+        vectors={
+            "Point": (args.layers, args.features, 1),
+            "LineString": (args.layers, args.features, args.vertices),
+            "Polygon": (args.layers, args.features, args.vertices),
+        },
+        rasters=args.rasters,
+        raster_width=args.raster_size[0],
+        raster_height=args.raster_size[1],
+        ras_models=args.ras_models,
+        fgdb_layers=args.fgdb_layers,
+        seed=args.seed,
+    )
+    archive = build_archive(spec, args.workdir)
+
+    server = start_s3_stand_in(args.port)
+    try:
+        from stores.clients import s3_client
+
+        client = s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        uploads = [archive]
+        fgdb = archive.with_name(f"{spec.name}.gdb.zip")
+        if args.fgdb_layers:
+            uploads.append(fgdb)
+        for path in uploads:
+            client.upload_file(str(path), BUCKET, f"{PREFIX}/{path.name}")
+
+        results = bench_archive(f"{PREFIX}/{archive.name}", args.repeat, args.workers)
+        if args.fgdb_layers:
+            results.extend(bench_fgdb(f"{PREFIX}/{fgdb.name}", args.repeat))
+    finally:
+        server.stop()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "archive": archive.name,
+            "archive_bytes": archive.stat().st_size,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output == "-":
+        print(text)
+    else:
+        pl.Path(args.output).write_text(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Deterministic synthetic archives for the benchmarks: shapefiles, GeoTIFFs,
+HEC-RAS projects and FGDB layers zipped the way USACE delivers them
+"""
+from dataclasses import dataclass, field
+import fiona
+import logging
+import numpy as np
+import pathlib as pl
+import rasterio
+from rasterio.transform import from_bounds
+import shutil
+import tempfile
+import zipfile
+
+# Projected CRS and extent (Texas, State Plane North Central ft) of every dataset
+CRS = "EPSG:2276"
+EXTENT = (2300000.0, 6900000.0, 2600000.0, 7200000.0)
+
+GEOMETRY_TYPES = ["Point", "LineString", "Polygon"]
+
+
+@dataclass
+class ArchiveSpec:
+    """
+    Contents of one synthetic zip. `vectors` maps a geometry type to
+    (layers, features per layer, vertices per feature)
+    """
+
+    vectors: dict = field(
+        default_factory=lambda: {
+            "Point": (1, 10000, 1),
+            "LineString": (1, 1000, 50),
+            "Polygon": (1, 1000, 50),
+        }
+    )
+    rasters: int = 1
+    raster_width: int = 2048
+    raster_height: int = 2048
+    ras_models: int = 1
+    fgdb_layers: int = 0
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        vectors = "-".join(
+            f"{t.lower()}{n}x{f}x{v}" for t, (n, f, v) in self.vectors.items()
+        )
+        return (
+            f"synthetic-{vectors}-r{self.rasters}x{self.raster_width}x{self.raster_height}"
+            f"-ras{self.ras_models}-gdb{self.fgdb_layers}-s{self.seed}"
+        )
+
+
+def _coordinates(rng: np.random.Generator, n: int) -> np.ndarray:
+    minx, miny, maxx, maxy = EXTENT
+    return np.column_stack(
+        [rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n)]
+    )
+
+
+def _geometry(rng: np.random.Generator, geom_type: str, vertices: int) -> dict:
+    if geom_type == "Point":
+        return {"type": "Point", "coordinates": tuple(_coordinates(rng, 1)[0])}
+
+    center = _coordinates(rng, 1)[0]
+    radius = rng.uniform(500, 5000)
+    if geom_type == "LineString":
+        steps = rng.normal(0, radius / max(vertices, 1), (vertices, 2))
+        coords = center + np.cumsum(steps, axis=0)
+        return {"type": "LineString", "coordinates": [tuple(c) for c in coords]}
+
+    # Star-shaped ring, so the polygon is valid for any vertex count
+    angles = np.sort(rng.uniform(0, 2 * np.pi, max(vertices, 3)))
+    radii = radius * rng.uniform(0.5, 1.0, len(angles))
+    coords = center + np.column_stack([np.cos(angles), np.sin(angles)]) * radii[:, None]
+    ring = [tuple(c) for c in coords] + [tuple(coords[0])]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def write_vector(
+    path: pl.Path,
+    geom_type: str,
+    features: int,
+    vertices: int,
+    rng: np.random.Generator,
+    driver: str = "ESRI Shapefile",
+    layer: str = None,
+) -> None:
+    schema = {"geometry": geom_type, "properties": {"id": "int", "value": "float"}}
+    with fiona.open(
+        path, "w", driver=driver, crs=CRS, schema=schema, layer=layer
+    ) as dst:
+        dst.writerecords(
+            {
+                "geometry": _geometry(rng, geom_type, vertices),
+                "properties": {"id": i, "value": float(rng.uniform())},
+            }
+            for i in range(features)
+        )
+
+
+def write_raster(
+    path: pl.Path, width: int, height: int, rng: np.random.Generator
+) -> None:
+    """
+    Tiled, compressed Float32 GeoTIFF of a smooth surface with a nodata border
+    """
+    y, x = np.mgrid[0:height, 0:width].astype("float32")
+    data = np.sin(x / 97) * np.cos(y / 131) * 50 + rng.normal(0, 1, (height, width))
+    data = data.astype("float32")
+    data[: height // 20, :] = -9999
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=width,
+        height=height,
+        count=1,
+        dtype="float32",
+        crs=CRS,
+        transform=from_bounds(*EXTENT, width, height),
+        nodata=-9999,
+        tiled=True,
+        compress="deflate",
+    ) as dst:
+        dst.write(data, 1)
+
+
+def write_ras_model(directory: pl.Path, name: str) -> None:
+    """
+    HEC-RAS project (.prj) and geometry (.g01) headers; the geometry's third
+    line holds the view window read by get_ras_model_meta
+    """
+    minx, miny, maxx, maxy = EXTENT
+    (directory / f"{name}.prj").write_text(
+        f"Proj Title={name}\nCurrent Plan=p01\nGeom File=g01\n"
+    )
+    (directory / f"{name}.g01").write_text(
+        f"Geom Title={name}\nProgram Version=6.30\n"
+        f"Viewing Rectangle= {minx} , {miny} , {maxx} , {maxy}\n"
+    )
+    (directory / f"{name}.p01").write_text(f"Plan Title={name}\nGeom File=g01\n")
+
+
+def build_archive(spec: ArchiveSpec, directory: str = None) -> pl.Path:
+    """
+    Write the datasets for `spec` into a temporary directory and zip them;
+    the same spec always yields the same contents
+    """
+    rng = np.random.default_rng(spec.seed)
+    directory = pl.Path(directory or tempfile.mkdtemp(prefix="ffrdcat-bench-"))
+    staging = directory / spec.name
+    staging.mkdir(parents=True, exist_ok=True)
+
+    for geom_type, (layers, features, vertices) in spec.vectors.items():
+        for i in range(layers):
+            path = staging / f"{geom_type.lower()}_{i}.shp"
+            write_vector(path, geom_type, features, vertices, rng)
+
+    for i in range(spec.rasters):
+        write_raster(
+            staging / f"raster_{i}.tif", spec.raster_width, spec.raster_height, rng
+        )
+
+    for i in range(spec.ras_models):
+        write_ras_model(staging, f"model_{i}")
+
+    archive = directory / f"{spec.name}.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(staging.iterdir()):
+            zf.write(path, path.name)
+    logging.info(f"build_archive | {archive}: {archive.stat().st_size} bytes")
+
+    if spec.fgdb_layers:
+        build_fgdb_archive(spec, directory, rng)
+    return archive
+
+
+def build_fgdb_archive(
+    spec: ArchiveSpec, directory: pl.Path, rng: np.random.Generator
+) -> pl.Path:
+    """
+    `<name>.gdb.zip` holding one file geodatabase whose layers cycle through
+    the vector geometry types (needs GDAL's OpenFileGDB write support, 3.6+)
+    """
+    gdb = directory / f"{spec.name}.gdb"
+    shutil.rmtree(gdb, ignore_errors=True)
+    specs = list(spec.vectors.items())
+    for i in range(spec.fgdb_layers):
+        geom_type, (_, features, vertices) = specs[i % len(specs)]
+        write_vector(
+            gdb,
+            geom_type,
+            features,
+            vertices,
+            rng,
+            driver="OpenFileGDB",
+            layer=f"{geom_type.lower()}_{i}",
+        )
+
+    archive = directory / f"{spec.name}.gdb.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(gdb.rglob("*")):
+            zf.write(path, path.relative_to(directory))
+    return archive
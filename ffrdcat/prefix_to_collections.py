@@ -0,0 +1,117 @@
+from dotenv import load_dotenv, find_dotenv
+from functools import partial
+import json
+import logging
+import pathlib as pl
+from papipyplug import plugin_logger
+
+from stores.admission import archive_memory_budget
+from stores.batch import Archive, discover_zips, item_workers_per_archive, run_batch
+from stores.clients import fiona_session, s3_client, s3_filesystem
+from zip_to_collection import catalog_zip
+
+plugin_params = {
+    "required": ["project", "bucket", "prefix"],
+    "optional": [
+        "archive_workers",
+        "workers",
+        "zip_index_cache",
+        "raster_footprint",
+        "point_budget",
+        "manifest_key",
+        "mirror",
+        "scratch_dir",
+        "gdal_config",
+        "memory_budget",
+        "thumbnail_cache",
+        "thumbnail_cache_dir",
+        "timing",
+        "timing_export",
+    ],
+}
+
+# Plugin params passed through to every archive
+ARCHIVE_PARAMS = [
+    "zip_index_cache",
+    "raster_footprint",
+    "point_budget",
+    "mirror",
+    "scratch_dir",
+    "gdal_config",
+    "memory_budget",
+    "thumbnail_cache",
+    "thumbnail_cache_dir",
+    "timing",
+    "timing_export",
+]
+
+
+def init_worker():
+    """
+    Once per process: environment, logging and the shared clients
+    """
+    try:
+        load_dotenv(find_dotenv())
+    except:
+        pass
+
+    plugin_logger()
+    s3_client()
+    s3_filesystem()
+    fiona_session()
+
+
+def catalog_archive(project: str, params: dict, archive: Archive) -> dict:
+    if ".gdb.zip" in archive.key:
+        logging.warning(f"prefix_reader | {archive.key}: zipped gdb, skipping")
+        return {"status": "skipped", "error": "zipped gdb not supported"}
+
+    collection_title = pl.Path(archive.key).name
+    return catalog_zip(project, archive.bucket, archive.key, collection_title, params)
+
+
+def main(params: dict) -> dict:
+    init_worker()
+
+    (project, bucket, prefix) = (
+        params["project"],
+        params["bucket"],
+        params["prefix"],
+    )
+    archive_workers = int(params.get("archive_workers", 1))
+
+    archive_params = {k: params[k] for k in ARCHIVE_PARAMS if k in params}
+    archive_params["workers"] = int(
+        params.get("workers", item_workers_per_archive(archive_workers))
+    )
+    # Each archive worker admits items under its own budget: split the total
+    archive_params["memory_budget"] = archive_memory_budget(
+        archive_workers, float(params.get("memory_budget", 0)) or None
+    )
+
+    archives = discover_zips(s3_filesystem(), bucket, prefix)
+    logging.info(
+        f"prefix_reader | {bucket}/{prefix}: {len(archives)} archives on {archive_workers} workers, {archive_params['workers']} item workers and {archive_params['memory_budget']:.2f} GB each"
+    )
+
+    manifest = run_batch(
+        archives,
+        partial(catalog_archive, project, archive_params),
+        archive_workers=archive_workers,
+        initializer=init_worker,
+    )
+
+    if "manifest_key" in params:
+        logging.info(f"prefix_reader | writing manifest to {params['manifest_key']}")
+        s3_client().put_object(
+            Body=json.dumps(manifest),
+            Bucket=bucket,
+            Key=params["manifest_key"],
+            ContentType="application/json",
+        )
+        manifest["manifest"] = params["manifest_key"]
+
+    logging.info(
+        f"prefix_reader | {bucket}/{prefix}: {manifest['total']} archives, {manifest['failed']} failed"
+    )
+    return manifest
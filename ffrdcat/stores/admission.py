@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+from typing import Callable, Iterator, List
+
+# Share of the memory limit (cgroup or physical) item builders may hold at once
+MEMORY_BUDGET_FRACTION = 0.6
+
+# In-memory geometry (shapely objects in a GeoSeries) per byte of .shp
+VECTOR_MEMORY_FACTOR = 4.0
+
+# Rasters are read at thumbnail resolution, so their cost is roughly fixed (GB)
+RASTER_MEMORY_GB = 0.05
+
+CGROUP_LIMITS = [
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+]
+
+
+def memory_limit_gb() -> float:
+    """
+    Memory available to the process: the container (cgroup) limit when one
+    is set and lower than the physical memory
+    """
+    limit = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    for path in CGROUP_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limit = min(limit, int(value))
+    return limit / 1024**3
+
+
+def default_memory_budget(fraction: float = MEMORY_BUDGET_FRACTION) -> float:
+    return memory_limit_gb() * fraction
+
+
+def archive_memory_budget(archive_workers: int, total: float = None) -> float:
+    """
+    Share of the memory budget (GB) each archive may use when several are
+    cataloged at once, so that archives x budget stays within the limit
+    """
+    return (total or default_memory_budget()) / max(1, archive_workers)
+
+
+def vector_memory_gb(shp_bytes: int) -> float:
+    return shp_bytes * VECTOR_MEMORY_FACTOR / 1024**3
+
+
+def streaming_memory_gb(approx_size: float, nrows: int, batch_size: int) -> float:
+    """
+    A streamed layer only holds one batch of features at a time
+    """
+    if not nrows:
+        return 0.0
+    return approx_size * min(1.0, batch_size / nrows)
+
+
+class MemoryBudget:
+    """
+    Counting semaphore over GB. An item larger than the whole budget is
+    admitted alone rather than never
+    """
+
+    def __init__(self, budget_gb: float):
+        self.budget = budget_gb
+        self.in_use = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, cost: float, stopped: threading.Event = None) -> float:
+        """
+        Block until `cost` fits; returns None instead when `stopped` is set
+        while waiting
+        """
+        cost = min(max(cost, 0.0), self.budget)
+        with self._cond:
+            while self.in_use > 0 and self.in_use + cost > self.budget:
+                if stopped is not None and stopped.is_set():
+                    return None
+                self._cond.wait()
+            self.in_use += cost
+        return cost
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self, cost: float) -> None:
+        with self._cond:
+            self.in_use -= cost
+            self._cond.notify_all()
+
+
+class AdmissionScheduler:
+    """
+    Submits tasks to an executor largest estimated memory first, holding
+    each back until its estimate fits in the budget next to the tasks
+    already running. Results are yielded in task order.
+
+    Once the consumer stops (a task raised, or the results are abandoned)
+    no further task is submitted and queued ones are cancelled; callers
+    should also `stop()` before shutting the executor down
+    """
+
+    def __init__(self, executor, budget: MemoryBudget):
+        self.executor = executor
+        self.budget = budget
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.budget.wake()
+
+    def map(self, fn: Callable, tasks: List, costs: List[float]) -> Iterator:
+        futures = [None] * len(tasks)
+        submitted = [threading.Event() for _ in tasks]
+        errors = []
+
+        def submit_all():
+            try:
+                for i in sorted(range(len(tasks)), key=lambda i: -costs[i]):
+                    cost = self.budget.acquire(costs[i], self._stopped)
+                    if cost is None or self._stopped.is_set():
+                        if cost is not None:
+                            self.budget.release(cost)
+                        return
+                    logging.debug(
+                        f"AdmissionScheduler | admitting task {i}: {cost:.3f} GB, {self.budget.in_use:.3f}/{self.budget.budget:.3f} GB in use"
+                    )
+                    try:
+                        future = self.executor.submit(fn, tasks[i])
+                    except Exception:
+                        self.budget.release(cost)
+                        raise
+                    future.add_done_callback(
+                        lambda _, cost=cost: self.budget.release(cost)
+                    )
+                    futures[i] = future
+                    submitted[i].set()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                for event in submitted:
+                    event.set()
+
+        threading.Thread(target=submit_all, name="admission", daemon=True).start()
+
+        completed = False
+        try:
+            for i in range(len(tasks)):
+                submitted[i].wait()
+                if futures[i] is None:
+                    raise errors[0] if errors else RuntimeError("admission stopped")
+                yield futures[i].result()
+            completed = True
+        finally:
+            if not completed:
+                self.stop()
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import logging
+import multiprocessing
+import os
+import time
+from typing import Callable, List
+
+
+@dataclass
+class Archive:
+    bucket: str
+    key: str
+    size: int
+
+
+def discover_zips(fs, bucket: str, prefix: str) -> List[Archive]:
+    """
+    Every zip under the prefix from one recursive listing, largest first
+    """
+    listing = fs.find(f"{bucket}/{prefix.strip('/')}", detail=True)
+    archives = [
+        Archive(bucket=bucket, key=path[len(bucket) + 1 :], size=info["size"])
+        for path, info in listing.items()
+        if path.lower().endswith(".zip")
+    ]
+    logging.info(f"discover_zips | {bucket}/{prefix}: found {len(archives)} zips")
+    return sorted(archives, key=lambda archive: archive.size, reverse=True)
+
+
+def item_workers_per_archive(archive_workers: int, cpu_count: int = None) -> int:
+    """
+    Item processes each archive may use so that archives x items stays
+    within the cores available
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // max(1, archive_workers))
+
+
+def _run_archive(job: Callable, archive: Archive) -> dict:
+    entry = {
+        "bucket": archive.bucket,
+        "key": archive.key,
+        "size": archive.size,
+        "status": "ok",
+    }
+    started = time.perf_counter()
+    try:
+        entry.update(job(archive))
+    except Exception as e:
+        logging.error(f"run_batch | {archive.key}: failed: {e}")
+        entry["status"] = "failed"
+        entry["error"] = str(e)
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+def run_batch(
+    archives: List[Archive],
+    job: Callable,
+    archive_workers: int = 1,
+    initializer: Callable = None,
+) -> dict:
+    """
+    Run `job(archive)` for every archive and collect one manifest.
+
+    Archives are submitted largest first so the longest ones start early and
+    small ones fill in behind them. Worker processes are long lived: imports,
+    shared clients and GDAL caches are set up once per worker (by
+    `initializer`) and reused by every archive it handles
+    """
+    started = time.perf_counter()
+    entries = []
+
+    if archive_workers <= 1:
+        if initializer is not None:
+            initializer()
+        entries = [_run_archive(job, archive) for archive in archives]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=archive_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+        ) as executor:
+            futures = [
+                executor.submit(_run_archive, job, archive) for archive in archives
+            ]
+            for future in as_completed(futures):
+                entry = future.result()
+                logging.info(
+                    f"run_batch | {entry['key']}: {entry['status']} in {entry['seconds']}s"
+                )
+                entries.append(entry)
+
+    entries.sort(key=lambda entry: entry["key"])
+    return {
+        "archives": entries,
+        "total": len(entries),
+        "failed": sum(entry["status"] == "failed" for entry in entries),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,115 @@
+import boto3
+from botocore.config import Config
+import fiona
+import logging
+import os
+import s3fs
+import threading
+from urllib.parse import urlparse
+
+# Connection pool shared by every thread using the client (uploader, stores)
+S3_MAX_POOL_CONNECTIONS = 64
+S3_CONNECT_TIMEOUT = 10
+S3_READ_TIMEOUT = 60
+S3_RETRIES = {"max_attempts": 10, "mode": "adaptive"}
+
+# Re-entrant: factories build on other shared objects (client -> session)
+_lock = threading.RLock()
+_clients = {}
+_pid = None
+
+
+def s3_config_kwargs(max_pool_connections: int = S3_MAX_POOL_CONNECTIONS) -> dict:
+    """
+    botocore Config arguments: a pool large enough for the upload threads,
+    TCP keep-alive so idle pooled connections survive between requests, and
+    adaptive retries for throttling
+    """
+    return {
+        "max_pool_connections": max_pool_connections,
+        "connect_timeout": S3_CONNECT_TIMEOUT,
+        "read_timeout": S3_READ_TIMEOUT,
+        "retries": S3_RETRIES,
+        "tcp_keepalive": True,
+    }
+
+
+def aws_credentials() -> dict:
+    return {
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+        "aws_session_token": os.getenv("AWS_SESSION_TOKEN"),
+    }
+
+
+def s3_endpoint_url() -> str:
+    """
+    S3-compatible endpoint to use instead of AWS (e.g. a local stand-in for
+    benchmarks), None for AWS
+    """
+    return os.getenv("FFRDCAT_S3_ENDPOINT_URL")
+
+
+def _shared(name: str, factory):
+    """
+    One instance per process: clients are safe to share between threads but
+    not across a fork, so the cache is dropped when the pid changes
+    """
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            _clients.clear()
+            _pid = os.getpid()
+        if name not in _clients:
+            logging.debug(f"clients | creating shared {name}")
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def boto3_session() -> boto3.session.Session:
+    return _shared("boto3_session", lambda: boto3.session.Session(**aws_credentials()))
+
+
+def s3_client():
+    """
+    Process-wide S3 client with a tuned connection pool
+    """
+    return _shared(
+        "s3_client",
+        lambda: boto3_session().client(
+            "s3", endpoint_url=s3_endpoint_url(), config=Config(**s3_config_kwargs())
+        ),
+    )
+
+
+def s3_filesystem() -> s3fs.S3FileSystem:
+    credentials = aws_credentials()
+    return _shared(
+        "s3_filesystem",
+        lambda: s3fs.S3FileSystem(
+            key=credentials["aws_access_key_id"],
+            secret=credentials["aws_secret_access_key"],
+            token=credentials["aws_session_token"],
+            endpoint_url=s3_endpoint_url(),
+            config_kwargs=s3_config_kwargs(),
+        ),
+    )
+
+
+def fiona_session() -> fiona.session.AWSSession:
+    """
+    GDAL takes the endpoint as host[:port]; plain http endpoints also need
+    AWS_HTTPS=NO in the GDAL config
+    """
+    endpoint = s3_endpoint_url()
+    if endpoint is not None:
+        endpoint = urlparse(endpoint).netloc
+    return _shared(
+        "fiona_session",
+        lambda: fiona.session.AWSSession(**aws_credentials(), endpoint_url=endpoint),
+    )
+
+
+def reset_clients() -> None:
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,171 @@
+from alphashape import alphashape
+from dataclasses import dataclass
+import logging
+import numpy as np
+import shapely
+from typing import Tuple
+from shapely import Geometry
+from shapely.errors import UnsupportedGEOSVersionError
+
+DEFAULT_POINT_BUDGET = 5000
+DEFAULT_HULL_RATIO = 0.5
+FOOTPRINT_METHODS = ["auto", "concave_hull", "alphashape", "convex_hull"]
+
+# Grid coarsening factor applied until the decimated set fits the budget
+GRID_GROWTH = 1.5
+
+
+@dataclass
+class Footprint:
+    geometry: Geometry
+    method: str
+    point_budget: int = None
+    input_points: int = 0
+    hull_points: int = 0
+    mode: str = "in_memory"
+
+    @property
+    def properties(self) -> dict:
+        return {
+            "mode": self.mode,
+            "method": self.method,
+            "point_budget": self.point_budget,
+            "input_points": self.input_points,
+            "hull_points": self.hull_points,
+        }
+
+
+def _grid_keys(points: np.ndarray, origin: np.ndarray, cell: float) -> np.ndarray:
+    cells = np.floor((points - origin) / cell).astype(np.int64)
+    cells -= cells.min(axis=0)
+    return cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1]
+
+
+def _fit_grid(
+    points: np.ndarray, origin: np.ndarray, cell: float, point_budget: int
+) -> Tuple[np.ndarray, float]:
+    """
+    Keep one vertex per occupied cell, coarsening the grid until the result
+    fits the budget; returns the kept vertices and the final cell size
+    """
+    while True:
+        _, first = np.unique(_grid_keys(points, origin, cell), return_index=True)
+        if len(first) <= point_budget:
+            return points[np.sort(first)], cell
+        cell *= GRID_GROWTH
+
+
+def _initial_cell(points: np.ndarray, point_budget: int) -> float:
+    span = points.max(axis=0) - points.min(axis=0)
+    area = span[0] * span[1]
+    if area > 0:
+        return np.sqrt(area / point_budget)
+    return max(max(span) / point_budget, np.finfo(float).eps)
+
+
+def decimate_points(
+    points: np.ndarray, point_budget: int = DEFAULT_POINT_BUDGET
+) -> np.ndarray:
+    """
+    Drop non-finite vertices, then snap to a regular grid (keeping one vertex
+    per occupied cell, which also removes duplicates) coarse enough to fit
+    the budget
+    """
+    points = points[np.isfinite(points).all(axis=1)]
+    if len(points) <= point_budget:
+        return np.unique(points, axis=0)
+
+    origin = points.min(axis=0)
+    points, _ = _fit_grid(
+        points, origin, _initial_cell(points, point_budget), point_budget
+    )
+    return points
+
+
+class StreamingHull:
+    """
+    Accumulates vertices batch by batch into a grid-decimated set that never
+    exceeds the point budget, so memory stays fixed however large the layer
+    """
+
+    def __init__(self, point_budget: int = DEFAULT_POINT_BUDGET):
+        self.point_budget = point_budget
+        self.points = np.empty((0, 2))
+        self.input_points = 0
+        self._origin = None
+        self._cell = None
+
+    def add(self, points: np.ndarray) -> None:
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points) == 0:
+            return
+        self.input_points += len(points)
+
+        combined = np.concatenate([self.points, points])
+        if self._cell is None:
+            combined = np.unique(combined, axis=0)
+            if len(combined) <= self.point_budget:
+                self.points = combined
+                return
+            self._origin = combined.min(axis=0)
+            self._cell = _initial_cell(combined, self.point_budget)
+
+        self.points, self._cell = _fit_grid(
+            combined, self._origin, self._cell, self.point_budget
+        )
+
+
+def _convex_hull(points: np.ndarray) -> Geometry:
+    return shapely.convex_hull(shapely.multipoints(points))
+
+
+def hull_from_points(
+    points: np.ndarray,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    method: str = "auto",
+    ratio: float = DEFAULT_HULL_RATIO,
+) -> Footprint:
+    """
+    Concave hull of an (N, 2) coordinate array whose cost is bounded by the
+    point budget rather than the number of input vertices.
+
+    method `auto` uses GEOS concave hull and falls back to alphashape on the
+    decimated points when GEOS is older than 3.11
+    """
+    if method not in FOOTPRINT_METHODS:
+        raise ValueError(f"method must be one of {FOOTPRINT_METHODS} not `{method}`")
+
+    input_points = len(points)
+    points = decimate_points(points, point_budget)
+    logging.debug(
+        f"hull_from_points | decimated {input_points} vertices to {len(points)}"
+    )
+
+    hull, used = None, method
+    if len(points) < 4:
+        used = "convex_hull"
+
+    if used in ["auto", "concave_hull"]:
+        try:
+            hull = shapely.concave_hull(shapely.multipoints(points), ratio=ratio)
+            used = "concave_hull"
+        except UnsupportedGEOSVersionError:
+            if method == "concave_hull":
+                raise
+            used = "alphashape"
+
+    if used == "alphashape":
+        hull = alphashape(points, alpha=1)
+
+    polygonal = ["Polygon", "MultiPolygon"]
+    if hull is None or hull.is_empty or hull.geom_type not in polygonal:
+        hull = _convex_hull(points)
+        used = "convex_hull"
+
+    return Footprint(
+        geometry=hull,
+        method=used,
+        point_budget=point_budget,
+        input_points=input_points,
+        hull_points=len(points),
+    )
@@ -0,0 +1,96 @@
+import atexit
+from contextlib import ExitStack, nullcontext
+import fiona
+import json
+import logging
+import os
+import rasterio
+import threading
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+# Process-wide GDAL/VSI settings; environment variables of the same name and
+# the `gdal_config` plugin param override them
+DEFAULT_GDAL_CONFIG = {
+    # Raster block cache, MB
+    "GDAL_CACHEMAX": "512",
+    # Cache of blocks read through VSI file handles (zip members, S3), bytes
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(64 * 1024**2),
+    # Bytes per /vsis3/ range request and the global cache of fetched ranges
+    "CPL_VSIL_CURL_CHUNK_SIZE": str(1024**2),
+    "CPL_VSIL_CURL_CACHE_SIZE": str(256 * 1024**2),
+    # Do not list sibling files when opening a dataset
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+}
+
+_lock = threading.Lock()
+_state = {"pid": None, "stack": None, "config": None}
+
+
+def gdal_config(overrides: dict = None) -> dict:
+    """
+    Defaults, then environment variables of the same name, then `overrides`
+    (a dict or a JSON object string)
+    """
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides)
+    config = dict(DEFAULT_GDAL_CONFIG)
+    config.update({k: os.environ[k] for k in DEFAULT_GDAL_CONFIG if k in os.environ})
+    config.update({k: str(v) for k, v in (overrides or {}).items()})
+    return config
+
+
+def gdal_env_active() -> bool:
+    return _state["pid"] == os.getpid()
+
+
+def enter_gdal_env(
+    overrides: dict = None, session: fiona.session.AWSSession = None
+) -> dict:
+    """
+    Enter the fiona and rasterio environments once per process and keep
+    them open, so the VSI caches and opened zip directories survive between
+    datasets. Later calls return the settings already in effect
+    """
+    with _lock:
+        if gdal_env_active():
+            return dict(_state["config"])
+
+        config = gdal_config(overrides)
+        credentials = session.get_credential_options() if session is not None else {}
+        stack = ExitStack()
+        stack.enter_context(fiona.Env(session=session, **config))
+        stack.enter_context(rasterio.Env(**{**config, **credentials}))
+        if pyogrio is not None:
+            pyogrio.set_gdal_config_options({**config, **credentials})
+        atexit.register(stack.close)
+
+        logging.info(f"enter_gdal_env | {config}")
+        _state.update(pid=os.getpid(), stack=stack, config=config)
+        return dict(config)
+
+
+def effective_gdal_config() -> dict:
+    """
+    Settings of the process environment, None if it has not been entered
+    """
+    return dict(_state["config"]) if gdal_env_active() else None
+
+
+def layer_env(session: fiona.session.AWSSession = None):
+    """
+    Per-open fiona environment, only needed when the process environment
+    has not been entered
+    """
+    if gdal_env_active():
+        return nullcontext()
+    if session is None:
+        return fiona.Env()
+    return fiona.Env(session=session)
@@ -0,0 +1,109 @@
+import json
+import logging
+from pystac import Item
+
+# Item property recording the zip members (CRC32 and size) an item was built from
+SOURCE_PROPERTY = "FFRD:source"
+
+
+def member_fingerprint(members: dict, names: list) -> dict:
+    """
+    CRC32 and uncompressed size of each named member, straight from the
+    central directory, so no member bytes are read
+    """
+    return {
+        name: {"crc32": members[name].crc32, "size": members[name].file_size}
+        for name in sorted(names)
+        if name in members
+    }
+
+
+def source_properties(
+    member: str, fingerprint: dict, projection: str = None, options: dict = None
+) -> dict:
+    """
+    `options` are the settings the geometry and thumbnail were rendered
+    with; an item built with other settings is rebuilt rather than carried
+    """
+    source = {"member": member, "members": fingerprint, "options": options or {}}
+    if projection is not None:
+        source["projection"] = projection
+    return source
+
+
+class PublishedItems:
+    """
+    Items from a previous run of a collection, keyed by the member they were
+    built from. `carry_forward` hands back the previous item when every
+    member it was built from, and the options it was rendered with, are
+    unchanged. `stale` lists the items whose member left the archive
+    """
+
+    def __init__(self, items: list, paths: dict = None):
+        self._by_member = {}
+        self._paths = paths or {}
+        self.carried = []
+        for item in items:
+            source = item.properties.get(SOURCE_PROPERTY)
+            if source:
+                self._by_member[source["member"]] = item
+
+    def __len__(self):
+        return len(self._by_member)
+
+    @classmethod
+    def from_s3(cls, fs, bucket: str, collection_id: str):
+        """
+        Load every item JSON under stac/collections/{collection_id}/ in one
+        batched fetch
+        """
+        paths = fs.glob(f"{bucket}/stac/collections/{collection_id}/*/*.json")
+        if not paths:
+            logging.info(f"PublishedItems | {collection_id}: no previous items found")
+            return cls([])
+
+        items, item_paths = [], {}
+        for path, body in fs.cat(paths, on_error="omit").items():
+            try:
+                item = Item.from_dict(json.loads(body))
+            except Exception as e:
+                logging.warning(f"PublishedItems | unable to read {path}: {e}")
+                continue
+            items.append(item)
+            item_paths[item.id] = path
+        logging.info(f"PublishedItems | {collection_id}: loaded {len(items)} items")
+        return cls(items, item_paths)
+
+    def unchanged(self, member: str, fingerprint: dict, options: dict = None) -> bool:
+        item = self._by_member.get(member)
+        if item is None:
+            return False
+        source = item.properties[SOURCE_PROPERTY]
+        return (
+            source.get("members") == fingerprint
+            and source.get("options") == (options or {})
+        )
+
+    def carry_forward(
+        self, member: str, fingerprint: dict, options: dict = None
+    ) -> Item:
+        if not self.unchanged(member, fingerprint, options):
+            return None
+        item = self._by_member[member]
+
+        # Links are rebuilt when the item is added to the new collection
+        item.clear_links()
+        self.carried.append(item.id)
+        return item
+
+    def stale(self, members: list) -> dict:
+        """
+        Path of each previous item (by id) built from a member no longer in
+        the archive
+        """
+        members = set(members)
+        return {
+            item.id: self._paths.get(item.id)
+            for member, item in self._by_member.items()
+            if member not in members
+        }
@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import errno
+import fcntl
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+
+from .clients import s3_client
+from .zip_index import archive_fingerprint
+
+MIRROR_MODES = ["auto", "always", "never"]
+
+# Below this size an archive costs few enough ranged reads that it is read in place
+MIRROR_MIN_SIZE = 32 * 1024**2
+
+# Above this size only the members being rebuilt are worth fetching, with
+# ranged reads, rather than the whole archive
+MIRROR_MAX_SIZE = 4 * 1024**3
+
+# Share of the free scratch space an automatic mirror may take
+MIRROR_DISK_FRACTION = 0.5
+
+# Bytes per ranged GET, and GETs in flight, when downloading a mirror
+MIRROR_PART_SIZE = 16 * 1024**2
+MIRROR_WORKERS = 16
+
+
+def scratch_dir(path: str = None) -> str:
+    """
+    Local directory (disk or tmpfs such as /dev/shm) that holds mirrors
+    """
+    return path or os.getenv("FFRDCAT_SCRATCH_DIR") or tempfile.gettempdir()
+
+
+def should_mirror(
+    size: int,
+    directory: str,
+    mode: str = "auto",
+    min_size: int = MIRROR_MIN_SIZE,
+    max_size: int = MIRROR_MAX_SIZE,
+    disk_fraction: float = MIRROR_DISK_FRACTION,
+) -> bool:
+    """
+    `auto` mirrors mid-size archives while they fit in a share of the free
+    scratch space; `always` mirrors whenever the archive fits. Mirrors being
+    downloaded have their space allocated up front, so the free space seen
+    here already excludes them
+    """
+    if mode not in MIRROR_MODES:
+        raise ValueError(f"mode must be one of {MIRROR_MODES} not `{mode}`")
+    if mode == "never":
+        return False
+
+    free = shutil.disk_usage(directory).free
+    if mode == "always":
+        if size > free:
+            logging.warning(
+                f"should_mirror | {size} bytes do not fit in {directory} ({free} free), reading in place"
+            )
+            return False
+        return True
+    return min_size <= size <= min(max_size, free * disk_fraction)
+
+
+@contextmanager
+def scratch_lock(directory: str):
+    """
+    Serializes the free-space check and allocation of mirrors between the
+    processes sharing a scratch directory (archive workers in batch mode)
+    """
+    with open(os.path.join(directory, ".ffrdcat-mirror.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ArchiveMirror:
+    """
+    Local copy of an S3 archive. Exposes the `cat_file`/`size`/`info` subset
+    of an fsspec filesystem used by zip_index, served from a memory map, and
+    a local path for GDAL's `/vsizip/`. Only the process that downloaded the
+    mirror removes it; copies sent to worker processes re-map the file
+    """
+
+    def __init__(self, bucket: str, key: str, path: str, nbytes: int, etag: str = None):
+        self.bucket = bucket
+        self.key = key
+        self.path = path
+        self.nbytes = nbytes
+        self.etag = etag
+        self._map = None
+        self._owner = True
+
+    @classmethod
+    def reserve(
+        cls,
+        bucket: str,
+        key: str,
+        nbytes: int,
+        etag: str = None,
+        directory: str = None,
+        mode: str = "auto",
+    ):
+        """
+        Claim scratch space for the archive when `should_mirror` picks it,
+        None otherwise. The file is allocated while holding the scratch lock,
+        so concurrent mirrors cannot claim the same free space
+        """
+        if mode == "never":
+            return None
+        directory = scratch_dir(directory)
+        with scratch_lock(directory):
+            if not should_mirror(nbytes, directory, mode):
+                return None
+            fd, path = tempfile.mkstemp(
+                prefix="ffrdcat-mirror-", suffix=".zip", dir=directory
+            )
+            try:
+                os.posix_fallocate(fd, 0, nbytes)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    os.close(fd)
+                    os.remove(path)
+                    logging.warning(
+                        f"ArchiveMirror | {bucket}/{key}: no space for {nbytes} bytes in {directory}, reading in place"
+                    )
+                    return None
+                # Filesystems without fallocate get a sparse file instead
+                os.ftruncate(fd, nbytes)
+            os.close(fd)
+        return cls(bucket, key, path, nbytes, etag)
+
+    def fetch(
+        self, part_size: int = MIRROR_PART_SIZE, max_workers: int = MIRROR_WORKERS
+    ):
+        """
+        Parallel ranged GETs written in place into the reserved file. Parts
+        are conditional on the ETag so a re-upload mid-download fails loudly
+        """
+        client = s3_client()
+        extra = {"IfMatch": self.etag} if self.etag else {}
+        nbytes = self.nbytes
+
+        logging.info(
+            f"ArchiveMirror | {self.bucket}/{self.key}: mirroring {nbytes} bytes to {self.path}"
+        )
+        fd = os.open(self.path, os.O_WRONLY)
+
+        def fetch_part(start: int) -> int:
+            end = min(start + part_size, nbytes) - 1
+            response = client.get_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Range=f"bytes={start}-{end}",
+                **extra,
+            )
+            return os.pwrite(fd, response["Body"].read(), start)
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="s3-mirror"
+            ) as executor:
+                written = sum(executor.map(fetch_part, range(0, nbytes, part_size)))
+            if written != nbytes:
+                raise IOError(f"mirrored {written} of {nbytes} bytes")
+        except Exception:
+            self.close()
+            raise
+        finally:
+            os.close(fd)
+        return self
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        if self._map is None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def cat_file(self, path: str, start: int = None, end: int = None) -> bytes:
+        return self.buffer[start:end]
+
+    def size(self, path: str) -> int:
+        return self.nbytes
+
+    def info(self, path: str) -> dict:
+        return {"size": self.nbytes, "ETag": self.etag}
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._owner and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_map"] = None
+        state["_owner"] = False
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@contextmanager
+def archive_mirror(
+    fs, bucket: str, key: str, mode: str = "auto", directory: str = None
+):
+    """
+    Yield a local mirror of the archive when `should_mirror` picks one for
+    its size and the free scratch space, otherwise None (read in place)
+    """
+    nbytes, etag = archive_fingerprint(fs, f"{bucket}/{key}")
+    mirror = ArchiveMirror.reserve(bucket, key, nbytes, etag, directory, mode)
+    if mirror is None:
+        yield None
+        return
+
+    with mirror.fetch():
+        yield mirror
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from .utils import read_file_from_zip
+from .zip_index import ZipMember
 
 
 @dataclass
@@ -16,8 +17,11 @@ STAC_RAS_MODEL_EXTENSIONS = [
 ]
 
 
-def get_ras_model_meta(fs, zip_filename: str, internal_filename: str = None) -> RasMeta:        
-    flines = read_file_from_zip(fs, zip_filename, internal_filename)
+def get_ras_model_meta(
+    fs, zip_filename: str, internal_filename: str = None, member: ZipMember = None
+) -> RasMeta:
+    # The view window is on the third line, so only the head of the file is streamed
+    flines = read_file_from_zip(fs, zip_filename, internal_filename, member, max_lines=3)
     view_window = flines[2]
     data = view_window.split()
     bbox= [float(data[2]),float(data[4]),float(data[6]),float(data[8])]
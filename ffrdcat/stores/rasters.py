@@ -1,11 +1,17 @@
 from dataclasses import dataclass
+import logging
 import numpy as np
-from pystac import Item, Asset, MediaType
+from pystac import MediaType
 import rasterio
-from rasterio.warp import reproject, Resampling
-from io import BytesIO
-from matplotlib import pyplot as plt
-import uuid
+from affine import Affine
+from rasterio import features
+from rasterio.enums import Resampling
+from rasterio.warp import transform_geom
+import shapely
+from shapely import Geometry
+from shapely.geometry import mapping, shape
+
+from .thumbnails import THUMBNAIL_SIZE, apply_colormap, encode_png, thumbnail_shape
 
 
 @dataclass
@@ -15,6 +21,8 @@ class RasterMeta:
     resoultion: float
 
 
+RASTER_FOOTPRINT_MODES = ["bbox", "valid_data"]
+
 STAC_RASTER_EXTENSIONS = [
     # "https://stac-extensions.github.io/projection/v1.0.0/schema.json",
     "https://stac-extensions.github.io/storage/v1.0.0/schema.json",
@@ -23,11 +31,14 @@ STAC_RASTER_EXTENSIONS = [
 
 
 def get_raster_meta(filename: str) -> RasterMeta:
-    with rasterio.Env(AWS_S3_ENDPOINT_URL="https://s3.amazonaws.com"):
-        with rasterio.open(filename) as src:
-            return RasterMeta(
-                bbox=src.bounds, projection=src.crs.to_string(), resoultion=src.res
-            )
+    """
+    Reads run inside the process GDAL environment (see gdal_env) when it
+    has been entered
+    """
+    with rasterio.open(filename) as src:
+        return RasterMeta(
+            bbox=src.bounds, projection=src.crs.to_string(), resoultion=src.res
+        )
 
 
 def raster_item_properties(
@@ -53,61 +64,65 @@ def raster_item_properties(
     }
 
 
-def make_raster_thumbnail(vsi_path: str, factor: int = 50, cmap: str = "inferno"):
-    with rasterio.open(vsi_path) as dataset:
-        # Full extent of the image --warning....
-        window = rasterio.windows.Window(0, 0, dataset.width, dataset.height)
-        data = dataset.read(window=window)
+@dataclass
+class ThumbnailRead:
+    """
+    First band read once at thumbnail resolution (masked where there is no
+    data), with the transform and CRS of that grid. Both the valid-data
+    footprint and the thumbnail are made from it
+    """
 
-        # Calculate the lower resolution dimensions
-        new_width = dataset.width // factor
-        new_height = dataset.height // factor
+    data: np.ma.MaskedArray
+    transform: Affine
+    crs: rasterio.crs.CRS
 
-        transform = dataset.transform * dataset.transform.scale(
-            (dataset.width / new_width), (dataset.height / new_height)
+
+def read_thumbnail(vsi_path: str, max_size: int = THUMBNAIL_SIZE) -> ThumbnailRead:
+    """
+    Decimated masked read: GDAL serves it from the nearest internal overview
+    when one exists, so the cost tracks the thumbnail size, not the raster
+    size
+    """
+    with rasterio.open(vsi_path) as dataset:
+        rows, cols = thumbnail_shape(dataset.width, dataset.height, max_size)
+        logging.debug(
+            f"read_thumbnail | {vsi_path}: reading {(rows, cols)}, overviews {dataset.overviews(1)}"
+        )
+        data = dataset.read(
+            indexes=1,
+            out_shape=(rows, cols),
+            resampling=Resampling.nearest,
+            masked=True,
         )
-        resampled = np.empty(
-            (dataset.count, new_height, new_width), dataset.profile["dtype"]
+        transform = dataset.transform * Affine.scale(
+            dataset.width / cols, dataset.height / rows
         )
+        return ThumbnailRead(data, transform, dataset.crs)
+
 
-        for i in range(1, dataset.count + 1):
-            reproject(
-                source=data[i - 1],
-                destination=resampled[i - 1],
-                src_transform=dataset.transform,
-                src_crs=dataset.crs,
-                dst_transform=transform,
-                dst_crs=dataset.crs,
-                resampling=Resampling.nearest,
-            )
-
-        nodata_mask = resampled == dataset.nodata
-        resampled[nodata_mask] = -10
-
-        image_stream = BytesIO()
-        plt.imsave(image_stream, np.squeeze(resampled, axis=0), cmap=cmap, format="png")
-        plt.savefig(image_stream, format="png")
-        plt.close()
-        image_bytes = image_stream.getvalue()
-        return image_bytes
-
-
-def add_raster_thumbnail_asset_to_item(
-    vsi_path: str,
-    bucket: str,
-    thumbnail_key: str,
-    item: Item,
-) -> Item:
-    image_bytes = make_raster_thumbnail(vsi_path)
-
-    item.add_asset(
-        key=str(uuid.uuid4()),
-        asset=Asset(
-            href=f"https://{bucket}.s3.amazonaws.com/{thumbnail_key}",
-            media_type=MediaType.PNG,
-            title="thubmnail",
-            roles=["thumbnail"],
-        ),
-    )
-
-    return item, image_bytes
+def valid_data_footprint(read: ThumbnailRead, simplify_pixels: float = 1.0) -> Geometry:
+    """
+    Outline (4326) of the pixels holding data, polygonized from the mask of
+    the thumbnail-sized read
+    """
+    mask = (~np.ma.getmaskarray(read.data)).astype("uint8")
+    polygons = [
+        shape(geom)
+        for geom, value in features.shapes(
+            mask, mask=mask > 0, transform=read.transform
+        )
+    ]
+    if not polygons:
+        raise ValueError("raster has no valid data")
+
+    tolerance = simplify_pixels * max(abs(read.transform.a), abs(read.transform.e))
+    outline = shapely.union_all(polygons).simplify(tolerance)
+    return shape(transform_geom(read.crs, "EPSG:4326", mapping(outline)))
+
+
+def make_raster_thumbnail(read: ThumbnailRead, cmap: str = "inferno") -> bytes:
+    """
+    First band through a colormap lookup, nodata transparent, encoded
+    without pyplot so thumbnails can be rendered from a thread pool
+    """
+    return encode_png(apply_colormap(read.data, cmap))
@@ -0,0 +1,158 @@
+from botocore.exceptions import ClientError
+from functools import partial
+import hashlib
+import json
+import logging
+import os
+import pathlib as pl
+from pystac import Asset, Item, MediaType
+from typing import Callable, Tuple
+import uuid
+
+from .clients import s3_client
+from .timing import NULL_TIMER, ItemTimer
+
+# Bump when rendering changes so cached thumbnails are not reused across versions
+THUMBNAIL_RENDERER = "ffrdcat-thumbnails/1"
+
+DEFAULT_THUMBNAIL_PREFIX = "stac/thumbnails"
+
+
+class ThumbnailCache:
+    """
+    Thumbnails stored as S3 objects under a content-hash prefix, keyed by the
+    CRC32/size of the members they were rendered from and the renderer
+    parameters, so identical inputs are rendered once across runs and
+    collections. `local_dir` keeps a copy of every thumbnail this host
+    uploaded, which answers lookups without a HEAD request; the copy is only
+    written once the upload has succeeded
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = DEFAULT_THUMBNAIL_PREFIX,
+        local_dir: str = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.local_dir = local_dir
+
+    def key_for(self, fingerprint: dict, params: dict) -> str:
+        payload = json.dumps(
+            {"members": fingerprint, "renderer": THUMBNAIL_RENDERER, **params},
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{self.prefix}/{digest[:2]}/{digest}.png"
+
+    def href(self, key: str) -> str:
+        return thumbnail_href(self.bucket, key)
+
+    def _local_path(self, key: str) -> pl.Path:
+        return pl.Path(self.local_dir) / key
+
+    def exists(self, key: str) -> bool:
+        if self.local_dir is not None and self._local_path(key).exists():
+            return True
+        try:
+            s3_client().head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ["404", "NoSuchKey", "NotFound"]:
+                return False
+            raise
+
+    def _keep_local(self, key: str, png: bytes) -> None:
+        path = self._local_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(png)
+        except OSError as e:
+            logging.warning(f"ThumbnailCache | unable to write {path}: {e}")
+
+    def put(self, key: str, png: bytes, uploader=None) -> None:
+        keep_local = None
+        if self.local_dir is not None:
+            keep_local = partial(self._keep_local, key, png)
+
+        if uploader is None:
+            s3_client().put_object(
+                Body=png, Bucket=self.bucket, Key=key, ContentType="image/png"
+            )
+            if keep_local is not None:
+                keep_local()
+        else:
+            uploader.put(self.bucket, key, png, "image/png", on_success=keep_local)
+
+    @classmethod
+    def from_env(cls, bucket: str, prefix: str = None, local_dir: str = None):
+        """
+        Enabled by a prefix (plugin param or FFRDCAT_THUMBNAIL_CACHE);
+        FFRDCAT_THUMBNAIL_CACHE_DIR adds the local tier
+        """
+        prefix = prefix or os.getenv("FFRDCAT_THUMBNAIL_CACHE")
+        local_dir = local_dir or os.getenv("FFRDCAT_THUMBNAIL_CACHE_DIR")
+        if prefix:
+            return cls(bucket, prefix, local_dir)
+        return None
+
+
+def thumbnail_href(bucket: str, key: str) -> str:
+    return f"https://{bucket}.s3.amazonaws.com/{key}"
+
+
+def add_thumbnail_asset(item: Item, href: str) -> Item:
+    item.add_asset(
+        key=str(uuid.uuid4()),
+        asset=Asset(
+            href=href,
+            media_type=MediaType.PNG,
+            title="thumbnail",
+            roles=["thumbnail"],
+        ),
+    )
+    return item
+
+
+def publish_thumbnail(
+    item: Item,
+    bucket: str,
+    key: str,
+    key_params: dict,
+    render: Callable[[], bytes],
+    uploader=None,
+    cache: ThumbnailCache = None,
+    source: dict = None,
+    timer: ItemTimer = NULL_TIMER,
+) -> Tuple[Item, str, bool]:
+    """
+    Render the thumbnail (`render()` returns the PNG), upload it to `key`
+    and link it from the item. With a `cache` and the `source` member
+    fingerprint the thumbnail is stored under a content-addressed key built
+    from `key_params` instead, and only rendered on a miss. Returns the
+    item, the thumbnail key and whether the cached thumbnail was reused
+    """
+    cached = False
+    if cache is not None and source is not None:
+        key = cache.key_for(source, key_params)
+        with timer.stage("thumbnail"):
+            cached = cache.exists(key)
+        if cached:
+            return add_thumbnail_asset(item, cache.href(key)), key, True
+
+    with timer.stage("thumbnail"):
+        png = render()
+
+    if uploader is not None:
+        timer.upload(key)
+    with timer.stage("upload"):
+        if cache is not None and source is not None:
+            cache.put(key, png, uploader)
+        elif uploader is None:
+            s3_client().put_object(
+                Body=png, Bucket=bucket, Key=key, ContentType="image/png"
+            )
+        else:
+            uploader.put(bucket, key, png, "image/png")
+    return add_thumbnail_asset(item, thumbnail_href(bucket, key)), key, cached
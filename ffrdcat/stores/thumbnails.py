@@ -0,0 +1,145 @@
+from functools import lru_cache
+import matplotlib
+import numpy as np
+from rasterio import features
+from rasterio.transform import from_bounds
+import shapely
+import struct
+import zlib
+
+# Longest side, in pixels, of raster thumbnails and footprint masks
+THUMBNAIL_SIZE = 512
+
+# Vector thumbnails: features drawn opaque over the footprint at FOOTPRINT_ALPHA
+FEATURE_RGB = (0, 0, 0)
+FOOTPRINT_RGB = (31, 119, 180)
+FOOTPRINT_ALPHA = 0.3
+
+# Share of the data extent left blank around vector thumbnails
+PADDING = 0.02
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COMPRESSION = 6
+
+
+def thumbnail_shape(width: int, height: int, max_size: int = THUMBNAIL_SIZE) -> tuple:
+    """
+    (rows, cols) of a thumbnail whose longest side is at most max_size
+    """
+    scale = max(width, height) / max_size
+    if scale <= 1:
+        return height, width
+    return max(1, round(height / scale)), max(1, round(width / scale))
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+
+def encode_png(rgba: np.ndarray, compression: int = PNG_COMPRESSION) -> bytes:
+    """
+    8-bit RGBA PNG of a (rows, cols, 4) uint8 array; every row uses filter 0
+    """
+    rows, cols, _ = rgba.shape
+    scanlines = np.zeros((rows, cols * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(rows, cols * 4)
+    header = struct.pack(">2I5B", cols, rows, 8, 6, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(cmap: str) -> np.ndarray:
+    """
+    (256, 4) uint8 RGBA lookup table of a matplotlib colormap
+    """
+    lut = matplotlib.colormaps[cmap](np.linspace(0, 1, 256), bytes=True)
+    lut.setflags(write=False)
+    return lut
+
+
+def apply_colormap(values: np.ma.MaskedArray, cmap: str = "inferno") -> np.ndarray:
+    """
+    Stretch the unmasked values over the colormap; masked pixels (and NaN
+    or infinite values) are transparent
+    """
+    rgba = np.zeros((*values.shape, 4), dtype=np.uint8)
+    values_data = np.asarray(values.data, dtype="float64")
+    valid = ~np.ma.getmaskarray(values) & np.isfinite(values_data)
+    if not valid.any():
+        return rgba
+
+    data = values_data[valid]
+    low, high = data.min(), data.max()
+    scale = 255 / (high - low) if high > low else 0
+    index = np.clip((data - low) * scale, 0, 255).astype(np.uint8)
+    rgba[valid] = colormap_lut(cmap)[index]
+    return rgba
+
+
+def _vector_extent(geometries: np.ndarray, footprint) -> tuple:
+    minx, miny, maxx, maxy = shapely.total_bounds(
+        np.append(geometries, np.array([footprint], dtype=object))
+    )
+    pad = max(maxx - minx, maxy - miny) * PADDING or 1e-6
+    return minx - pad, miny - pad, maxx + pad, maxy + pad
+
+
+def render_vector_thumbnail(
+    geometries: np.ndarray, footprint, max_size: int = THUMBNAIL_SIZE
+) -> bytes:
+    """
+    Rasterize the features (opaque) over the footprint (translucent) on a
+    grid whose longest side is max_size. Uses no shared plotting state, so
+    it is safe to call from several threads at once
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    geometries = geometries[~shapely.is_missing(geometries)]
+    geometries = geometries[np.isfinite(shapely.bounds(geometries)).all(axis=1)]
+
+    minx, miny, maxx, maxy = _vector_extent(geometries, footprint)
+    scale = max_size / max(maxx - minx, maxy - miny)
+    rows = max(1, round((maxy - miny) * scale))
+    cols = max(1, round((maxx - minx) * scale))
+    transform = from_bounds(minx, miny, maxx, maxy, cols, rows)
+
+    rgba = np.zeros((rows, cols, 4), dtype=np.uint8)
+    rgba[..., :3] = 255
+    rgba[..., 3] = 255
+
+    hull = features.rasterize(
+        [footprint], out_shape=(rows, cols), transform=transform, dtype="uint8"
+    ).astype(bool)
+    blended = np.array(FOOTPRINT_RGB) * FOOTPRINT_ALPHA + 255 * (1 - FOOTPRINT_ALPHA)
+    rgba[hull, :3] = blended.round().astype(np.uint8)
+
+    def draw(shapes: np.ndarray) -> np.ndarray:
+        return features.rasterize(
+            shapes,
+            out_shape=(rows, cols),
+            transform=transform,
+            all_touched=True,
+            dtype="uint8",
+        ).astype(bool)
+
+    points = np.isin(shapely.get_type_id(geometries), [0, 4])
+    if (~points).any():
+        rgba[draw(geometries[~points]), :3] = FEATURE_RGB
+    if points.any():
+        # Grow point features (only) to 3x3 pixels so they stay visible
+        padded = np.pad(draw(geometries[points]), 1)
+        grown = np.logical_or.reduce(
+            [
+                padded[1 + dy : 1 + dy + rows, 1 + dx : 1 + dx + cols]
+                for dy in (-1, 0, 1)
+                for dx in (-1, 0, 1)
+            ]
+        )
+        rgba[grown, :3] = FEATURE_RGB
+
+    return encode_png(rgba)
@@ -0,0 +1,289 @@
+from contextlib import contextmanager, nullcontext
+import os
+import time
+import uuid
+
+# Stages recorded by the item builders
+STAGES = [
+    "metadata",
+    "size_estimate",
+    "load",
+    "reproject",
+    "hull",
+    "thumbnail",
+    "upload",
+]
+
+_NULL_STAGE = nullcontext()
+
+
+class ItemTimer:
+    """
+    Wall and CPU (thread) time of each stage of building one item. Stages
+    may nest (a streaming hull times its batch reads as `load`): each stage
+    is charged its own time only, so stage totals add up to the item. A
+    disabled timer hands out one shared no-op context, so instrumented code
+    costs a method call per stage.
+
+    Uploads handed to an S3Uploader are only queued while the item is
+    built; `upload` names the key so the PUT, timed by the uploader, is
+    charged to the item afterwards (`TimingRecorder.add_uploads`)
+    """
+
+    def __init__(self, member: str = None, kind: str = None, enabled: bool = True):
+        self.member = member
+        self.kind = kind
+        self.enabled = enabled
+        self.spans = []
+        self.uploads = []
+        self.started_ns = time.time_ns()
+        self.ended_ns = None
+        # [wall, cpu] seconds spent in the children of each open stage
+        self._open = []
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        start_ns = time.time_ns()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        self._open.append([0.0, 0.0])
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            child_wall, child_cpu = self._open.pop()
+            if self._open:
+                self._open[-1][0] += elapsed
+                self._open[-1][1] += cpu
+            self.spans.append(
+                {
+                    "name": name,
+                    "start_ns": start_ns,
+                    "elapsed_s": elapsed,
+                    "wall_s": elapsed - child_wall,
+                    "cpu_s": cpu - child_cpu,
+                }
+            )
+
+    def upload(self, key: str) -> None:
+        if self.enabled:
+            self.uploads.append(key)
+
+    def finish(self) -> dict:
+        self.ended_ns = time.time_ns()
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        return {
+            "member": self.member,
+            "kind": self.kind,
+            "started_ns": self.started_ns,
+            "ended_ns": self.ended_ns or time.time_ns(),
+            "stages": _stage_totals(self.spans),
+            "spans": self.spans,
+            "uploads": self.uploads,
+        }
+
+
+NULL_TIMER = ItemTimer(enabled=False)
+
+
+class TimingRecorder:
+    """
+    Per-item stage timings of one archive, with per-stage aggregates and an
+    OpenTelemetry (OTLP JSON) export. Uploads no item claims (the collection
+    JSON, items carried forward) are charged to the archive
+    """
+
+    def __init__(self, archive: str):
+        self.archive = archive
+        self.items = []
+        self.archive_spans = []
+        self.started_ns = time.time_ns()
+        self._by_member = {}
+        self._by_upload = {}
+
+    def item(self, kind: str, member: str) -> ItemTimer:
+        return ItemTimer(member, kind)
+
+    def add(self, record: dict) -> None:
+        if record is None:
+            return
+        self.items.append(record)
+        self._by_member[record["member"]] = record
+        for key in record.get("uploads", []):
+            self._by_upload[key] = record
+
+    def assign_upload(self, key: str, member: str) -> None:
+        """
+        Charge the upload of `key` (e.g. the item JSON) to the item built
+        from `member`, when that item was timed
+        """
+        record = self._by_member.get(member)
+        if record is not None:
+            self._by_upload[key] = record
+
+    def add_uploads(self, uploads: list) -> None:
+        """
+        PUT timings recorded by S3Uploader, charged to the item that queued
+        each key, otherwise to the archive
+        """
+        for upload in uploads:
+            span = {
+                "name": "upload",
+                "key": upload["key"],
+                "start_ns": upload["start_ns"],
+                "elapsed_s": upload["wall_s"],
+                "wall_s": upload["wall_s"],
+                "cpu_s": upload["cpu_s"],
+            }
+            record = self._by_upload.get(upload["key"])
+            if record is None:
+                self.archive_spans.append(span)
+                continue
+            record["spans"].append(span)
+            record["stages"] = _stage_totals(record["spans"])
+            record["ended_ns"] = max(
+                record["ended_ns"], span["start_ns"] + int(span["wall_s"] * 1e9)
+            )
+
+    def stages(self) -> dict:
+        totals = {}
+        for record in self.items:
+            for name, stage in record["stages"].items():
+                total = totals.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "items": 0})
+                total["wall_s"] += stage["wall_s"]
+                total["cpu_s"] += stage["cpu_s"]
+                total["items"] += 1
+        return {
+            name: {k: round(v, 6) for k, v in totals[name].items()}
+            for name in sorted(totals, key=_stage_order)
+        }
+
+    def summary(self) -> dict:
+        return {
+            "archive": self.archive,
+            "wall_s": round((time.time_ns() - self.started_ns) / 1e9, 6),
+            "stages": self.stages(),
+            "archive_stages": {
+                name: {k: round(v, 6) for k, v in stage.items()}
+                for name, stage in _stage_totals(self.archive_spans).items()
+            },
+            "items": [
+                {
+                    "member": record["member"],
+                    "kind": record["kind"],
+                    "wall_s": round(
+                        (record["ended_ns"] - record["started_ns"]) / 1e9, 6
+                    ),
+                    "stages": {
+                        name: {k: round(v, 6) for k, v in stage.items()}
+                        for name, stage in record["stages"].items()
+                    },
+                }
+                for record in self.items
+            ],
+        }
+
+    def to_otel(self, service_name: str = "ffrdcat") -> dict:
+        """
+        One trace per archive: a root span, a span per item and a child span
+        per stage, in the OTLP JSON encoding
+        """
+        trace_id = uuid.uuid4().hex
+        root_id = os.urandom(8).hex()
+        ended_ns = time.time_ns()
+        spans = [
+            _otel_span(
+                trace_id, root_id, None, self.archive, self.started_ns, ended_ns, {}
+            )
+        ]
+        for span in self.archive_spans:
+            spans.append(_otel_stage_span(trace_id, root_id, span))
+        for record in self.items:
+            item_id = os.urandom(8).hex()
+            spans.append(
+                _otel_span(
+                    trace_id,
+                    item_id,
+                    root_id,
+                    record["member"],
+                    record["started_ns"],
+                    record["ended_ns"],
+                    {"ffrdcat.kind": record["kind"]},
+                )
+            )
+            for span in record["spans"]:
+                spans.append(_otel_stage_span(trace_id, item_id, span))
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_otel_attribute("service.name", service_name)]
+                    },
+                    "scopeSpans": [{"scope": {"name": "ffrdcat.stores"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+def _stage_totals(spans: list) -> dict:
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(span["name"], {"wall_s": 0.0, "cpu_s": 0.0})
+        stage["wall_s"] += span["wall_s"]
+        stage["cpu_s"] += span["cpu_s"]
+    return stages
+
+
+def _stage_order(name: str) -> int:
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+def _otel_attribute(key: str, value) -> dict:
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otel_span(
+    trace_id: str,
+    span_id: str,
+    parent_id: str,
+    name: str,
+    start_ns: int,
+    end_ns: int,
+    attributes: dict,
+) -> dict:
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [_otel_attribute(k, v) for k, v in attributes.items()],
+    }
+    if parent_id is not None:
+        span["parentSpanId"] = parent_id
+    return span
+
+
+def _otel_stage_span(trace_id: str, parent_id: str, span: dict) -> dict:
+    attributes = {"ffrdcat.self_s": span["wall_s"], "ffrdcat.cpu_s": span["cpu_s"]}
+    if "key" in span:
+        attributes["ffrdcat.key"] = span["key"]
+    return _otel_span(
+        trace_id,
+        os.urandom(8).hex(),
+        parent_id,
+        span["name"],
+        span["start_ns"],
+        span["start_ns"] + int(span["elapsed_s"] * 1e9),
+        attributes,
+    )
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+from typing import Callable
+
+from .clients import s3_client as shared_s3_client
+
+
+class S3Uploader:
+    """
+    Thread pool for S3 PUTs. `put` returns immediately while fewer than
+    `max_pending` uploads are in flight and blocks otherwise, so producers are
+    throttled instead of buffering an unbounded number of bodies in memory.
+    `on_success` runs once the object has been written. The wall and CPU
+    time of every PUT is kept in `timings`
+    """
+
+    def __init__(self, s3_client=None, max_workers: int = 16, max_pending: int = 64):
+        self.s3_client = s3_client or shared_s3_client()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="s3-upload"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self.timings = []
+
+    def put(
+        self,
+        bucket: str,
+        key: str,
+        body: bytes,
+        content_type: str = None,
+        on_success: Callable = None,
+    ):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._put, bucket, key, body, content_type)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        if on_success is not None:
+            future.add_done_callback(
+                lambda f: on_success() if f.exception() is None else None
+            )
+        self._futures.append((bucket, key, future))
+        return future
+
+    def _put(self, bucket: str, key: str, body: bytes, content_type: str = None):
+        extra = {"ContentType": content_type} if content_type else {}
+        start_ns = time.time_ns()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return self.s3_client.put_object(
+                Body=body, Bucket=bucket, Key=key, **extra
+            )
+        finally:
+            self.timings.append(
+                {
+                    "bucket": bucket,
+                    "key": key,
+                    "start_ns": start_ns,
+                    "wall_s": time.perf_counter() - wall,
+                    "cpu_s": time.thread_time() - cpu,
+                }
+            )
+
+    def wait(self) -> dict:
+        """
+        Block until every submitted upload finishes and report the outcome per object
+        """
+        wait([future for _, _, future in self._futures])
+        results = {"uploaded": [], "failed": []}
+        for bucket, key, future in self._futures:
+            error = future.exception()
+            if error is None:
+                results["uploaded"].append(key)
+            else:
+                logging.error(
+                    f"S3Uploader | failed to upload s3://{bucket}/{key}: {error}"
+                )
+                results["failed"].append(
+                    {"bucket": bucket, "key": key, "error": str(error)}
+                )
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class UploadBuffer:
+    """
+    Stand-in for S3Uploader inside worker processes: records uploads so the
+    parent can hand them to its own uploader
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def put(
+        self,
+        bucket: str,
+        key: str,
+        body: bytes,
+        content_type: str = None,
+        on_success: Callable = None,
+    ):
+        self.pending.append((bucket, key, body, content_type, on_success))
+
+    def replay(self, uploader: S3Uploader):
+        for upload in self.pending:
+            uploader.put(*upload)
+        self.pending = []
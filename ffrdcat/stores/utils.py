@@ -1,23 +1,58 @@
 import pathlib as pl
 from datetime import datetime, timezone
-from io import BytesIO
+from functools import lru_cache
+import io
 from shapely.geometry import Polygon
 import pyproj
 import s3fs
 from typing import List
-import zipfile
 import logging
 
+from .clients import s3_client
+from .zip_index import ZipMember, scan_central_directory, open_member
+
+# Distinct CRS definitions (and bboxes) kept before least recently used eviction
+CRS_CACHE_SIZE = 128
+AUTHORITY_MIN_CONFIDENCE = 90
+
+# Points added along each bbox edge when transforming bounds
+DENSIFY_POINTS = 21
+
+
+@lru_cache(maxsize=CRS_CACHE_SIZE)
+def normalize_crs(projection: str) -> str:
+    """
+    Authority code (e.g. EPSG:2276) when the CRS matches one, otherwise its
+    WKT, so equivalent definitions share one cached transformer
+    """
+    crs = pyproj.CRS.from_user_input(projection)
+    authority = crs.to_authority(min_confidence=AUTHORITY_MIN_CONFIDENCE)
+    if authority is not None:
+        return ":".join(authority)
+    return crs.to_wkt()
+
+
+@lru_cache(maxsize=CRS_CACHE_SIZE)
+def _cached_transformer_4326(crs: str, always_xy: bool) -> pyproj.Transformer:
+    return pyproj.Transformer.from_crs(crs, "epsg:4326", always_xy=always_xy)
+
 
 def transformer_4326(projection: str, always_xy: bool = True) -> pyproj.Transformer:
-    return pyproj.Transformer.from_crs(projection, "epsg:4326", always_xy=always_xy)
+    return _cached_transformer_4326(normalize_crs(projection), always_xy)
 
 
-def bbox_to_4326(bbox: tuple, projection: str) -> List[float]:
+@lru_cache(maxsize=CRS_CACHE_SIZE)
+def _cached_bbox_to_4326(bbox: tuple, projection: str) -> tuple:
     transformer = transformer_4326(projection)
-    return list(transformer.transform(bbox[0], bbox[1])) + list(
-        transformer.transform(bbox[2], bbox[3])
-    )
+    return transformer.transform_bounds(*bbox, densify_pts=DENSIFY_POINTS)
+
+
+def bbox_to_4326(bbox: tuple, projection: str) -> List[float]:
+    """
+    Edges are densified before transforming, so the result encloses the
+    curved outline of the source bbox rather than just its corners
+    """
+    return list(_cached_bbox_to_4326(tuple(bbox), projection))
 
 
 def footprint_from_bbox(bbox: tuple, projection: str) -> Polygon:
@@ -35,12 +70,14 @@ def footprint_from_bbox(bbox: tuple, projection: str) -> Polygon:
     )
 
 
+@lru_cache(maxsize=None)
 def texas_bbox() -> Polygon:
     return footprint_from_bbox(
         (-108.442783, 25.610107, -93.061924, 36.992270), "epsg:4326"
     )
 
 
+@lru_cache(maxsize=None)
 def us_bbox() -> Polygon:
     return footprint_from_bbox(
         (-129.740295, 20.941240, -61.888733, 50.106708), "epsg:4326"
@@ -67,14 +104,28 @@ def verify_key(bucket: str, key: str):
     pass
 
 
-def key_last_updated(bucket: str, key: str):
+@lru_cache(maxsize=None)
+def key_last_updated(bucket: str, key: str) -> datetime:
     """
-    TODO
+    LastModified of the object from a HEAD request, made once per key since
+    every item in an archive asks for it
     """
-    return datetime.now(tz=timezone.utc)
+    response = s3_client().head_object(Bucket=bucket, Key=key)
+    return response["LastModified"].astimezone(timezone.utc)
 
 
-def vsi_path(bucket: str, key: str, filename: str = None) -> str:
+def vsi_path(
+    bucket: str, key: str, filename: str = None, local_path: str = None
+) -> str:
+    """
+    `local_path` points GDAL at a local mirror of the archive instead of S3
+    """
+    if local_path is not None:
+        vsi_archive = f"/vsizip/{local_path}"
+        if filename is not None:
+            return f"{vsi_archive}/{filename}"
+        return vsi_archive
+
     if pl.Path(key).suffix == ".zip":
         vsi_prefix = "/vsizip/vsis3"
     else:
@@ -86,14 +137,32 @@ def vsi_path(bucket: str, key: str, filename: str = None) -> str:
         return f"{vsi_prefix}/{bucket}/{key}"
 
 
-def read_file_from_zip(fs: s3fs.S3FileSystem, s3_zip_file: str, internal_file:str):
-    with fs.open(s3_zip_file, "rb") as zip_file:
-        with zipfile.ZipFile(BytesIO(zip_file.read())) as zip_ref:
-            info = zip_ref.infolist()
-            for i in info:
-                logging.info(f"read_file_from_zip | {i.filename}")
-                if i.filename == internal_file:
-                    logging.debug(f"geometry file identified | {i.filename}")
-                    file_bytes = zip_ref.read(i.filename)
-                    data = file_bytes.decode()
-                    return data.splitlines()
\ No newline at end of file
+def read_file_from_zip(
+    fs: s3fs.S3FileSystem,
+    s3_zip_file: str,
+    internal_file: str,
+    member: ZipMember = None,
+    max_lines: int = None,
+):
+    """
+    Stream a single member out of the zip using ranged reads, optionally
+    stopping after `max_lines` lines
+    """
+    if member is None:
+        member = scan_central_directory(fs, s3_zip_file).by_name().get(internal_file)
+        if member is None:
+            logging.warning(f"read_file_from_zip | {internal_file} not found")
+            return None
+
+    logging.debug(f"geometry file identified | {member.filename}")
+    lines = []
+    # Decode as UTF-8 (as the whole-member read did), whatever the locale;
+    # stray bytes in hand-edited RAS files are replaced rather than fatal
+    with io.TextIOWrapper(
+        open_member(fs, s3_zip_file, member), encoding="utf-8", errors="replace"
+    ) as text:
+        for line in text:
+            lines.append(line.rstrip("\n"))
+            if max_lines is not None and len(lines) >= max_lines:
+                break
+    return lines
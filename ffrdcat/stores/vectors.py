@@ -1,16 +1,29 @@
-from alphashape import alphashape
 from dataclasses import dataclass
 import fiona
 import geopandas as gpd
-from io import BytesIO
+from itertools import islice
 import logging
-import matplotlib as mpl
-from matplotlib import pyplot as plt
 import numpy as np
-from pystac import Item, Asset, MediaType
-from shapely.geometry import mapping, Point
+import shapely
+from shapely.geometry import mapping, shape
 from shapely import Geometry
-import uuid
+import time
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+from .footprints import (
+    DEFAULT_POINT_BUDGET,
+    Footprint,
+    StreamingHull,
+    hull_from_points,
+)
+from .gdal_env import gdal_env_active, layer_env
+from .thumbnails import render_vector_thumbnail
+from .timing import NULL_TIMER, ItemTimer
+from .utils import transformer_4326
 
 
 @dataclass
@@ -22,6 +35,22 @@ class VectorMeta:
     shapefile_parts: list = None
 
 
+# Features per read when streaming large layers
+DEFAULT_BATCH_SIZE = 10000
+
+# Features read up front to estimate the in-memory size of a layer
+SAMPLE_SIZE = 100
+
+# Sampled reads of oversize layers: grid cells per side of the layer bounds,
+# features read overall, and the time allowed for the read
+SAMPLE_GRID = 16
+SAMPLE_FEATURES = 20000
+SAMPLE_SECONDS = 120.0
+
+# shapely.GeometryType ids
+LINE_TYPE_IDS = [1, 5]
+POLYGON_TYPE_IDS = [3, 6]
+
 STAC_VECTOR_EXTENSIONS = [
     # "https://stac-extensions.github.io/projection/v1.0.0/schema.json",
     "https://stac-extensions.github.io/storage/v1.0.0/schema.json",
@@ -65,170 +94,392 @@ def vector_item_properties(
     }
 
 
-def concave_hull_from_points(gdf: gpd.GeoDataFrame) -> Geometry:
-    gdf = gdf.to_crs("epsg:4326")
-    gdf = gdf.explode(index_parts=False)
-    gdf.replace([np.inf, -np.inf], np.nan, inplace=True)
-    gdf.dropna(inplace=True)
-    gdf.reset_index(drop=True, inplace=True)
-    geometry = gdf.geometry.apply(lambda geom: Point(geom.x, geom.y))
-    hull = alphashape(geometry, alpha=1)
-    logging.debug(mapping(hull))
-    return hull
+def geometry_coordinates(geometry, return_index: bool = False):
+    """
+    Vertices of every geometry as a single (N, 2) array. With return_index,
+    also return the position of the geometry each vertex came from
+    """
+    return shapely.get_coordinates(np.asarray(geometry), return_index=return_index)
+
+
+def _geometry_batches(src, batch_size: int = DEFAULT_BATCH_SIZE):
+    batch = []
+    for feature in src:
+        if feature.geometry is not None:
+            batch.append(shape(feature.geometry))
+        if len(batch) >= batch_size:
+            yield np.array(batch, dtype=object)
+            batch = []
+    if batch:
+        yield np.array(batch, dtype=object)
+
+
+def read_dataframe_arrow(
+    filename: str,
+    layer: str = None,
+    columns: list = None,
+    read_geometry: bool = True,
+    session: fiona.session.AWSSession = None,
+) -> gpd.GeoDataFrame:
+    """
+    Columnar bulk read through pyogrio with Arrow output: no per-feature dicts
+    are built. `columns=[]` reads the geometry column only
+    """
+    if pyogrio is None:
+        raise ImportError("pyogrio is required for arrow reads")
+    if session is not None and not gdal_env_active():
+        pyogrio.set_gdal_config_options(session.get_credential_options())
+    return pyogrio.read_dataframe(
+        filename,
+        layer=layer,
+        columns=columns,
+        read_geometry=read_geometry,
+        use_arrow=True,
+    )
 
 
-def poly_to_points(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    gdf = gdf.to_crs("epsg:4326")
-    points_list = []
-    for row in gdf.geometry:
-        if row.geom_type == "Polygon":
-            exterior_coords = list(
-                zip(
-                    row.exterior.coords.xy[0].tolist(),
-                    row.exterior.coords.xy[1].tolist(),
-                )
-            )
-            points_list.extend(exterior_coords)
+def has_fast_spatial_filter(
+    filename: str, layer: str = None, session: fiona.session.AWSSession = None
+) -> bool:
+    """
+    Whether GDAL can answer a bbox filter on the layer from a spatial index
+    (OLCFastSpatialFilter); without one every filter scans the whole layer.
+    Unknown (no pyogrio, or an older one) counts as no index
+    """
+    if pyogrio is None:
+        return False
+    if session is not None and not gdal_env_active():
+        pyogrio.set_gdal_config_options(session.get_credential_options())
+    try:
+        info = pyogrio.read_info(filename, layer=layer)
+    except Exception as e:
+        logging.warning(f"has_fast_spatial_filter | {filename} {layer or ''}: {e}")
+        return False
+    return bool(info.get("capabilities", {}).get("fast_spatial_filter", False))
+
+
+def iter_geometry_batches(
+    filename: str, layer: str = None, batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """
+    Yield arrays of shapely geometries `batch_size` features at a time, so
+    memory use does not grow with the size of the layer
+    """
+    with fiona.open(filename, layer=layer) as src:
+        yield from _geometry_batches(src, batch_size)
 
-            for interior in row.interiors:
-                interior_coords = list(
-                    zip(interior.coords.xy[0].tolist(), interior.coords.xy[1].tolist())
-                )
-                points_list.extend(interior_coords)
-
-        elif row.geom_type == "MultiPolygon":
-            for polygon in row.geoms:
-                exterior_coords = list(
-                    zip(
-                        polygon.exterior.coords.xy[0].tolist(),
-                        polygon.exterior.coords.xy[1].tolist(),
+
+class VectorProbe:
+    """
+    Opens a vector layer once and keeps the handle: schema, CRS, bounds,
+    feature count and a sampled memory estimate are read up front, geometry
+    and features are read lazily from the same handle
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        layer: str = None,
+        session: fiona.session.AWSSession = None,
+        sample_size: int = SAMPLE_SIZE,
+    ):
+        self.filename = filename
+        self.layer = layer
+        self._session = session
+        with self._env():
+            self._src = fiona.open(filename, layer=layer)
+            self.projection = self._src.crs_wkt
+            self.bounds = self._src.bounds
+            self.geom_type = self._src.schema["geometry"]
+            self.fields = list(self._src.schema["properties"].keys())
+            self.feature_count = len(self._src)
+            self._sample = list(islice(self._src, sample_size))
+
+    def _env(self):
+        return layer_env(self._session)
+
+    @property
+    def meta(self) -> VectorMeta:
+        if self.projection == "":
+            return None
+        return VectorMeta(
+            bbox=self.bounds,
+            projection=self.projection,
+            geom_type=self.geom_type,
+            fields=self.fields,
+        )
+
+    def approx_size(self) -> tuple:
+        """
+        In-memory size (GB) extrapolated from the sampled features, and the
+        feature count
+        """
+        if not self._sample or not self.feature_count:
+            return 0.0, self.feature_count
+        gdf = gpd.GeoDataFrame.from_features(self._sample)
+        per_feature = gdf.memory_usage(deep=True).sum() / len(self._sample)
+        return per_feature * self.feature_count / (1024**3), self.feature_count
+
+    def features(self):
+        with self._env():
+            yield from self._src
+
+    def iter_geometry_batches(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        with self._env():
+            yield from _geometry_batches(self._src, batch_size)
+
+    def iter_sampled_geometry_batches(
+        self,
+        max_features: int = SAMPLE_FEATURES,
+        max_seconds: float = SAMPLE_SECONDS,
+        grid: int = SAMPLE_GRID,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        """
+        Geometry batches from a spatially stratified sample: up to an equal
+        share of `max_features` from each cell of a grid over the layer
+        bounds, through the layer's spatial filter. Features spanning several
+        cells are taken once. Layers without a spatial index (where each
+        cell filter would scan the whole layer), or that cannot be filtered,
+        are read strided instead. Stops once `max_seconds` have passed;
+        what was read is recorded in `sample_info`
+        """
+        started = time.monotonic()
+        deadline = started + max_seconds
+        self.sample_info = {
+            "method": "stratified",
+            "sample_features": 0,
+            "feature_count": self.feature_count,
+        }
+
+        def counted(features):
+            for feature in features:
+                self.sample_info["sample_features"] += 1
+                yield feature
+
+        with self._env():
+            stratified = has_fast_spatial_filter(
+                self.filename, self.layer, self._session
+            )
+            if stratified:
+                try:
+                    yield from _geometry_batches(
+                        counted(
+                            self._stratified_features(grid, max_features, deadline)
+                        ),
+                        batch_size,
                     )
+                except Exception as e:
+                    if self.sample_info["sample_features"]:
+                        logging.warning(
+                            f"VectorProbe | {self.filename} {self.layer or ''}: sampled read stopped early: {e}"
+                        )
+                    else:
+                        logging.warning(
+                            f"VectorProbe | {self.filename} {self.layer or ''}: spatial filter failed, strided read: {e}"
+                        )
+                        stratified = False
+            else:
+                logging.info(
+                    f"VectorProbe | {self.filename} {self.layer or ''}: no spatial index, strided read"
                 )
-                points_list.extend(exterior_coords)
 
-                for interior in polygon.interiors:
-                    interior_coords = list(
-                        zip(
-                            interior.coords.xy[0].tolist(),
-                            interior.coords.xy[1].tolist(),
-                        )
-                    )
-                    points_list.extend(interior_coords)
+            if not stratified:
+                self.sample_info["method"] = "strided"
+                yield from _geometry_batches(
+                    counted(self._strided_features(max_features, deadline)),
+                    batch_size,
+                )
+        self.sample_info["seconds"] = round(time.monotonic() - started, 3)
+
+    def _stratified_features(self, grid: int, max_features: int, deadline: float):
+        minx, miny, maxx, maxy = self.bounds
+        dx, dy = (maxx - minx) / grid, (maxy - miny) / grid
+        per_cell = max(1, max_features // grid**2)
+        # The bbox filter is an intersects test: features spanning cells
+        # come back once per cell
+        seen = set()
+        for i in range(grid):
+            for j in range(grid):
+                cell = (
+                    minx + i * dx,
+                    miny + j * dy,
+                    minx + (i + 1) * dx,
+                    miny + (j + 1) * dy,
+                )
+                taken = 0
+                for feature in self._src.filter(bbox=cell):
+                    if time.monotonic() > deadline:
+                        return
+                    if feature.id in seen:
+                        continue
+                    seen.add(feature.id)
+                    yield feature
+                    taken += 1
+                    if taken >= per_cell:
+                        break
+
+    def _strided_features(self, max_features: int, deadline: float):
+        stride = max(1, self.feature_count // max_features)
+        for feature in self._src.filter(0, self.feature_count, stride):
+            yield feature
+            if time.monotonic() > deadline:
+                return
+
+    def read_arrow(self, columns: list = None) -> gpd.GeoDataFrame:
+        """
+        Bulk read through pyogrio when it is installed, None otherwise (or if
+        the read fails) so callers fall back to fiona
+        """
+        if pyogrio is None:
+            return None
+        try:
+            return read_dataframe_arrow(
+                self.filename, self.layer, columns=columns, session=self._session
+            )
+        except Exception as e:
+            logging.warning(
+                f"VectorProbe | {self.filename} {self.layer or ''}: arrow read failed, using fiona: {e}"
+            )
+            return None
 
-    points_geometry = [Point(x, y) for x, y in points_list]
-    return gpd.GeoDataFrame(geometry=points_geometry, crs="epsg:4326")
+    def read_geometry(self) -> gpd.GeoSeries:
+        """
+        Geometry column only, in the native CRS; attributes are never built
+        """
+        gdf = self.read_arrow(columns=[])
+        if gdf is not None:
+            return gdf.geometry[gdf.geometry.notna()].reset_index(drop=True)
+
+        batches = list(self.iter_geometry_batches())
+        geometry = np.concatenate(batches) if batches else np.array([], dtype=object)
+        return gpd.GeoSeries(geometry, crs=self.projection)
+
+    def read_gdf(self, columns: list = None) -> gpd.GeoDataFrame:
+        """
+        Layer as a GeoDataFrame, optionally restricted to `columns`
+        """
+        gdf = self.read_arrow(columns=columns)
+        if gdf is not None:
+            return gdf
+
+        gdf = gpd.GeoDataFrame.from_features(self.features(), crs=self.projection)
+        if columns is not None:
+            gdf = gdf[columns + ["geometry"]]
+        return gdf
+
+    def close(self):
+        self._src.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def streaming_hull(
+    batches,
+    projection: str,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    method: str = "auto",
+    timer: ItemTimer = NULL_TIMER,
+):
+    """
+    Footprint of a layer of any size from an iterable of geometry batches.
+    Vertices are decimated in the native CRS and only the retained set is
+    reprojected. Returns the footprint and the retained vertices (4326).
+    Reading each batch is timed as `load`, as for in-memory layers
+    """
+    accumulator = StreamingHull(point_budget)
+    batches = iter(batches)
+    while True:
+        with timer.stage("load"):
+            geometry = next(batches, None)
+        if geometry is None:
+            break
+        accumulator.add(geometry_coordinates(geometry))
+    if accumulator.input_points == 0:
+        raise ValueError("no vertices read from layer")
+
+    x, y = transformer_4326(projection).transform(
+        accumulator.points[:, 0], accumulator.points[:, 1]
+    )
+    points = np.column_stack([x, y])
+    footprint = hull_from_points(points, point_budget=point_budget, method=method)
+    footprint.input_points = accumulator.input_points
+    footprint.mode = "streaming"
+    return footprint, points
+
+
+def concave_hull_from_points(
+    points: np.ndarray,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    method: str = "auto",
+) -> Footprint:
+    """
+    points is an (N, 2) array of coordinates in 4326
+    """
+    footprint = hull_from_points(points, point_budget=point_budget, method=method)
+    logging.debug(mapping(footprint.geometry))
+    return footprint
 
 
-def line_to_points(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def poly_to_points(gdf: gpd.GeoDataFrame, return_index: bool = False):
+    """
+    Exterior and interior ring vertices of (multi)polygons in 4326; the
+    optional index gives the ring each vertex belongs to
+    """
     gdf = gdf.to_crs("epsg:4326")
-    points_list = []
-    for row in gdf.geometry:
-        if row.geom_type == "LineString":
-            coords = list(
-                zip(
-                    row.coords.xy[0].tolist(),
-                    row.coords.xy[1].tolist(),
-                )
-            )
-            points_list.extend(coords)
-
-        elif row.geom_type == "MultiLineString":
-            for line in row.geoms:
-                coords = list(
-                    zip(
-                        line.coords.xy[0].tolist(),
-                        line.coords.xy[1].tolist(),
-                    )
-                )
-                points_list.extend(coords)
+    geoms = np.asarray(gdf.geometry.values)
+    geoms = geoms[np.isin(shapely.get_type_id(geoms), POLYGON_TYPE_IDS)]
+    rings = shapely.get_rings(shapely.get_parts(geoms))
+    return geometry_coordinates(rings, return_index)
 
-    points_geometry = [Point(x, y) for x, y in points_list]
-    return gpd.GeoDataFrame(geometry=points_geometry, crs="epsg:4326")
+
+def line_to_points(gdf: gpd.GeoDataFrame, return_index: bool = False):
+    """
+    Vertices of (multi)linestrings in 4326; the optional index gives the line
+    part each vertex belongs to
+    """
+    gdf = gdf.to_crs("epsg:4326")
+    geoms = np.asarray(gdf.geometry.values)
+    geoms = geoms[np.isin(shapely.get_type_id(geoms), LINE_TYPE_IDS)]
+    return geometry_coordinates(shapely.get_parts(geoms), return_index)
 
 
-def to_hull(gdf: gpd.GeoDataFrame) -> Geometry:
+def to_hull(
+    gdf: gpd.GeoDataFrame,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    method: str = "auto",
+) -> Footprint:
     geometry_type = gdf.geometry.type.unique()[0].lower()
 
     if "polygon" in geometry_type or "multipolygon" in geometry_type:
         logging.debug("starting polygon simplification")
-        gdf = poly_to_points(gdf)
-        return concave_hull_from_points(gdf.simplify(0.05))
+        points = poly_to_points(gdf)
 
     elif "line" in geometry_type:
         logging.debug("starting line simplification")
-        gdf = line_to_points(gdf)
-        return concave_hull_from_points(gdf)
+        points = line_to_points(gdf)
 
     elif "point" in geometry_type:
         logging.debug("starting point simplification")
-        return concave_hull_from_points(gdf)
+        gdf = gdf.to_crs("epsg:4326")
+        points = geometry_coordinates(gdf.geometry.values)
 
+    return concave_hull_from_points(points, point_budget, method)
 
-def make_vector_thumbnail(gdf, footprint) -> None:
-    # Plot the original data and the concave hull
-    mpl.rcParams["savefig.pad_inches"] = 0.2
-    ax = plt.axes([0, 0, 1, 1], frameon=False)
-    ax.get_xaxis().set_visible(False)
-    ax.get_yaxis().set_visible(False)
-    plt.autoscale(tight=True)
-    gdf = gdf.to_crs("epsg:4326")
-    geometry_type = gdf.geometry.type.unique()[0].lower()
-    if "point" in geometry_type:
-        gdf.replace([np.inf, -np.inf], np.nan, inplace=True)
-        gdf.dropna(inplace=True)
-    gdf = gdf.simplify(0.1)
-    gdf.plot(ax=ax, color="black")
-    gpd.GeoSeries(footprint).plot(ax=ax, alpha=0.3)
-    ax.set_xticks([])
-    ax.set_yticks([])
-
-    image_stream = BytesIO()
-    plt.savefig(image_stream, format="png")
-    plt.close()
-    image_bytes = image_stream.getvalue()
-    return image_bytes
-
-
-def add_vector_thumbnail_asset_to_item(
-    gdf,
-    footprint,
-    bucket: str,
-    thumbnail_key: str,
-    item: Item,
-) -> Item:
-    image_bytes = make_vector_thumbnail(gdf, footprint)
-
-    item.add_asset(
-        key=str(uuid.uuid4()),
-        asset=Asset(
-            href=f"https://{bucket}.s3.amazonaws.com/{thumbnail_key}",
-            media_type=MediaType.PNG,
-            title="thubmnail",
-            roles=["thumbnail"],
-        ),
-    )
 
-    return item, image_bytes
+def make_vector_thumbnail(gdf, footprint) -> bytes:
+    """
+    Features rasterized over the footprint (both 4326), see
+    thumbnails.render_vector_thumbnail
+    """
+    gdf = gdf.to_crs("epsg:4326")
+    return render_vector_thumbnail(np.asarray(gdf.geometry.values), footprint)
 
 
 def approx_vector_size(bucket: str, key: str, vector_file: str) -> tuple:
-    # if isinstance(zv, ZippedFGDB):
-    #     with fiona.open(f"zip+s3://{zv.bucket}/{zv.key}", layer=zv.vector_name) as src:
-    #         features = []
-    #         for i, feature in enumerate(src):
-    #             if i < 1:
-    #                 features.append(feature)
-    #             else:
-    #                 break
-    # else:
-    with fiona.open(f"zip+s3://{bucket}/{key}/{vector_file}") as src:
-        features = []
-        nfeatures = len(src)
-        for i, feature in enumerate(src):
-            if i < 1:
-                features.append(feature)
-            else:
-                break
-    gdf = gpd.GeoDataFrame.from_features(features)
-    mem_reqs = gdf.memory_usage(deep=True).sum() * nfeatures / (1024**3)
-    return mem_reqs, nfeatures
+    with VectorProbe(f"zip+s3://{bucket}/{key}/{vector_file}") as probe:
+        return probe.approx_size()
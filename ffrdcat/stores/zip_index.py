@@ -0,0 +1,506 @@
+from dataclasses import dataclass, field
+import io
+import fsspec
+import hashlib
+import logging
+import lzma
+import os
+import pathlib as pl
+import struct
+from typing import Dict, Iterator, List, Tuple
+import zipfile
+import zlib
+
+# Fixed-size record layouts from the PKWARE APPNOTE (mirrors the stdlib zipfile)
+EOCD_STRUCT = "<4s4H2LH"
+EOCD_SIGNATURE = b"PK\x05\x06"
+EOCD_SIZE = struct.calcsize(EOCD_STRUCT)
+
+ZIP64_LOCATOR_STRUCT = "<4sLQL"
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_LOCATOR_SIZE = struct.calcsize(ZIP64_LOCATOR_STRUCT)
+
+ZIP64_EOCD_STRUCT = "<4sQ2H2L4Q"
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+ZIP64_EOCD_SIZE = struct.calcsize(ZIP64_EOCD_STRUCT)
+
+CENTRAL_DIR_STRUCT = "<4s4B4HL2L5H2L"
+CENTRAL_DIR_SIGNATURE = b"PK\x01\x02"
+CENTRAL_DIR_SIZE = struct.calcsize(CENTRAL_DIR_STRUCT)
+
+LOCAL_HEADER_STRUCT = "<4s2B4HL2L2H"
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_STRUCT)
+
+ZIP64_EXTRA_ID = 0x0001
+MAX_COMMENT = (1 << 16) - 1
+
+# Extra bytes requested past the central directory's view of a local header,
+# local extra fields are allowed to differ from the central directory copy
+LOCAL_HEADER_SLACK = 1024
+
+# Compressed bytes fetched per ranged read when streaming a member
+CHUNK_SIZE = 1 << 18
+
+# Sidecar index layout: header, then a zlib compressed run of member records
+INDEX_MAGIC = b"FFZI"
+INDEX_VERSION = 1
+INDEX_HEADER_STRUCT = "<4sHH3QL"
+INDEX_MEMBER_STRUCT = "<3QL2H2B2H"
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_STRUCT)
+INDEX_MEMBER_SIZE = struct.calcsize(INDEX_MEMBER_STRUCT)
+
+MEMBER_KINDS = ("other", "directory", "shapefile", "raster", "prj")
+
+
+@dataclass
+class ZipMember:
+    filename: str
+    header_offset: int
+    compress_size: int
+    file_size: int
+    crc32: int
+    compress_type: int
+    flag_bits: int = 0
+    extra_len: int = 0
+    kind: str = None
+    ras_project: bool = False
+
+    @property
+    def is_dir(self) -> bool:
+        return self.filename.endswith("/")
+
+
+@dataclass
+class ZipIndex:
+    size: int
+    cd_offset: int
+    cd_size: int
+    members: List[ZipMember] = field(default_factory=list)
+    etag: str = None
+
+    @property
+    def names(self) -> List[str]:
+        return [m.filename for m in self.members]
+
+    def by_name(self) -> Dict[str, ZipMember]:
+        return {m.filename: m for m in self.members}
+
+
+def classify_member(filename: str) -> str:
+    if filename.endswith("/"):
+        return "directory"
+    suffix = pl.Path(filename).suffix.lower()
+    if suffix == ".shp":
+        return "shapefile"
+    elif suffix == ".tif":
+        return "raster"
+    elif suffix == ".prj":
+        return "prj"
+    return "other"
+
+
+def read_range(fs, path: str, start: int, end: int) -> bytes:
+    """
+    Ranged read of [start, end) from an fsspec filesystem (a single GET on s3fs)
+    """
+    return fs.cat_file(path, start=start, end=end)
+
+
+def _parse_zip64_extra(extra: bytes, member: ZipMember) -> None:
+    """
+    Replace 0xFFFFFFFF placeholders with values from the ZIP64 extra field
+    """
+    i = 0
+    while i + 4 <= len(extra):
+        tp, ln = struct.unpack("<HH", extra[i : i + 4])
+        if tp == ZIP64_EXTRA_ID:
+            data = extra[i + 4 : i + 4 + ln]
+            values = list(
+                struct.unpack(f"<{len(data) // 8}Q", data[: len(data) // 8 * 8])
+            )
+            if member.file_size == 0xFFFFFFFF:
+                member.file_size = values.pop(0)
+            if member.compress_size == 0xFFFFFFFF:
+                member.compress_size = values.pop(0)
+            if member.header_offset == 0xFFFFFFFF:
+                member.header_offset = values.pop(0)
+            return
+        i += 4 + ln
+
+
+def _parse_central_directory(data: bytes, count: int, concat: int) -> List[ZipMember]:
+    members = []
+    pos = 0
+    while pos + CENTRAL_DIR_SIZE <= len(data):
+        centdir = struct.unpack(CENTRAL_DIR_STRUCT, data[pos : pos + CENTRAL_DIR_SIZE])
+        if centdir[0] != CENTRAL_DIR_SIGNATURE:
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+
+        flag_bits, compress_type = centdir[5], centdir[6]
+        crc, compress_size, file_size = centdir[9], centdir[10], centdir[11]
+        name_len, extra_len, comment_len = centdir[12], centdir[13], centdir[14]
+        header_offset = centdir[18]
+
+        pos += CENTRAL_DIR_SIZE
+        raw_name = data[pos : pos + name_len]
+        pos += name_len
+        extra = data[pos : pos + extra_len]
+        pos += extra_len + comment_len
+
+        encoding = "utf-8" if flag_bits & 0x800 else "cp437"
+        filename = raw_name.decode(encoding)
+        member = ZipMember(
+            filename=filename,
+            header_offset=header_offset,
+            compress_size=compress_size,
+            file_size=file_size,
+            crc32=crc,
+            compress_type=compress_type,
+            flag_bits=flag_bits,
+            extra_len=extra_len,
+            kind=classify_member(filename),
+        )
+        _parse_zip64_extra(extra, member)
+        member.header_offset += concat
+        members.append(member)
+
+    if len(members) != count:
+        logging.warning(
+            f"scan_central_directory | expected {count} entries, found {len(members)}"
+        )
+    return members
+
+
+def scan_central_directory(fs, path: str, size: int = None) -> ZipIndex:
+    """
+    Build a member index from the end-of-central-directory record and the
+    central directory alone (ZIP64 aware), using ranged reads only
+    """
+    if size is None:
+        size = fs.size(path)
+    if size < EOCD_SIZE:
+        raise zipfile.BadZipFile(f"{path} is too small to be a zip file")
+
+    # One GET covers the EOCD, the longest possible comment and the ZIP64 records
+    tail_start = max(
+        0, size - (EOCD_SIZE + MAX_COMMENT + ZIP64_LOCATOR_SIZE + ZIP64_EOCD_SIZE)
+    )
+    tail = read_range(fs, path, tail_start, size)
+
+    eocd_pos = tail.rfind(EOCD_SIGNATURE)
+    if eocd_pos < 0:
+        raise zipfile.BadZipFile(f"{path}: end of central directory record not found")
+
+    eocd = struct.unpack(EOCD_STRUCT, tail[eocd_pos : eocd_pos + EOCD_SIZE])
+    count, cd_size, cd_offset = eocd[4], eocd[5], eocd[6]
+    eocd_abs = tail_start + eocd_pos
+    records_end = eocd_abs
+
+    locator_pos = eocd_pos - ZIP64_LOCATOR_SIZE
+    if (
+        locator_pos >= 0
+        and tail[locator_pos : locator_pos + 4] == ZIP64_LOCATOR_SIGNATURE
+    ):
+        zip64_abs = eocd_abs - ZIP64_LOCATOR_SIZE - ZIP64_EOCD_SIZE
+        if zip64_abs >= tail_start:
+            rel = zip64_abs - tail_start
+            record = tail[rel : rel + ZIP64_EOCD_SIZE]
+        else:
+            record = read_range(fs, path, zip64_abs, zip64_abs + ZIP64_EOCD_SIZE)
+        zip64 = struct.unpack(ZIP64_EOCD_STRUCT, record)
+        if zip64[0] != ZIP64_EOCD_SIGNATURE:
+            raise zipfile.BadZipFile(f"{path}: corrupt ZIP64 end of central directory")
+        count, cd_size, cd_offset = zip64[7], zip64[8], zip64[9]
+        records_end = zip64_abs
+
+    # Bytes prepended to the archive (e.g. self-extracting stubs) shift every offset
+    concat = records_end - cd_size - cd_offset
+    cd_start = cd_offset + concat
+    if cd_start < 0:
+        raise zipfile.BadZipFile(f"{path}: bad central directory offset")
+
+    if cd_start >= tail_start:
+        rel = cd_start - tail_start
+        cd_bytes = tail[rel : rel + cd_size]
+    else:
+        cd_bytes = read_range(fs, path, cd_start, cd_start + cd_size)
+
+    logging.debug(
+        f"scan_central_directory | {path}: {count} entries, central directory {cd_size} bytes"
+    )
+    return ZipIndex(
+        size=size,
+        cd_offset=cd_start,
+        cd_size=cd_size,
+        members=_parse_central_directory(cd_bytes, count, concat),
+    )
+
+
+class _LZMADecompressor:
+    """
+    Raw LZMA stream behind the 4-byte zip LZMA header (version, properties
+    size) and the LZMA1 properties, as in the stdlib zipfile
+    """
+
+    def __init__(self):
+        self._decomp = None
+        self._unconsumed = b""
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._decomp is None:
+            self._unconsumed += data
+            if len(self._unconsumed) <= 4:
+                return b""
+            (psize,) = struct.unpack("<H", self._unconsumed[2:4])
+            if len(self._unconsumed) <= 4 + psize:
+                return b""
+
+            self._decomp = lzma.LZMADecompressor(
+                lzma.FORMAT_RAW,
+                filters=[
+                    lzma._decode_filter_properties(
+                        lzma.FILTER_LZMA1, self._unconsumed[4 : 4 + psize]
+                    )
+                ],
+            )
+            data = self._unconsumed[4 + psize :]
+            self._unconsumed = b""
+        return self._decomp.decompress(data)
+
+
+def _decompressor(member: ZipMember):
+    if member.compress_type == zipfile.ZIP_STORED:
+        return None
+    elif member.compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    elif member.compress_type == zipfile.ZIP_BZIP2:
+        import bz2
+
+        return bz2.BZ2Decompressor()
+    elif member.compress_type == zipfile.ZIP_LZMA:
+        return _LZMADecompressor()
+    raise NotImplementedError(
+        f"compression method {member.compress_type} not supported for {member.filename}"
+    )
+
+
+def iter_member(
+    fs, path: str, member: ZipMember, chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Stream the decompressed contents of one member. The first ranged read
+    covers the local header and up to `chunk_size` compressed bytes, so small
+    members (and callers that stop early) cost a single GET
+    """
+    if member.flag_bits & 0x1:
+        raise NotImplementedError(f"{member.filename} is encrypted")
+
+    start = member.header_offset
+    end = start + LOCAL_HEADER_SIZE + len(member.filename.encode()) + member.extra_len
+    end += LOCAL_HEADER_SLACK + min(member.compress_size, chunk_size)
+    buf = read_range(fs, path, start, end)
+
+    header = struct.unpack(LOCAL_HEADER_STRUCT, buf[:LOCAL_HEADER_SIZE])
+    if header[0] != LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad magic number for file header: {member.filename}")
+
+    data_start = LOCAL_HEADER_SIZE + header[10] + header[11]
+    data_end = start + data_start + member.compress_size
+    pending = buf[data_start : data_start + member.compress_size]
+    position = start + data_start + len(pending)
+
+    decompressor = _decompressor(member)
+    crc = 0
+    while True:
+        chunk = pending if decompressor is None else decompressor.decompress(pending)
+        crc = zlib.crc32(chunk, crc)
+        if chunk:
+            yield chunk
+        if position >= data_end:
+            break
+        pending = read_range(fs, path, position, min(position + chunk_size, data_end))
+        if not pending:
+            raise zipfile.BadZipFile(f"Truncated data for file {member.filename}")
+        position += len(pending)
+
+    if hasattr(decompressor, "flush"):
+        chunk = decompressor.flush()
+        crc = zlib.crc32(chunk, crc)
+        if chunk:
+            yield chunk
+
+    if crc != member.crc32:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {member.filename}")
+
+
+class MemberReader(io.RawIOBase):
+    """
+    Read-only file object over `iter_member`
+    """
+
+    def __init__(self, fs, path: str, member: ZipMember, chunk_size: int = CHUNK_SIZE):
+        self.member = member
+        self._chunks = iter_member(fs, path, member, chunk_size)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def open_member(
+    fs, path: str, member: ZipMember, chunk_size: int = CHUNK_SIZE
+) -> io.BufferedReader:
+    return io.BufferedReader(MemberReader(fs, path, member, chunk_size))
+
+
+def read_member(fs, path: str, member: ZipMember) -> bytes:
+    """
+    Fetch the local header and compressed bytes of one member and return the
+    decompressed contents
+    """
+    return b"".join(iter_member(fs, path, member, chunk_size=member.compress_size + 1))
+
+
+def dump_index(index: ZipIndex) -> bytes:
+    """
+    Serialize an index (member names, offsets, sizes, CRC, kind, RAS flag)
+    """
+    etag = (index.etag or "").encode()
+    records = []
+    for m in index.members:
+        name = m.filename.encode()
+        records.append(
+            struct.pack(
+                INDEX_MEMBER_STRUCT,
+                m.header_offset,
+                m.compress_size,
+                m.file_size,
+                m.crc32,
+                m.compress_type,
+                m.flag_bits,
+                MEMBER_KINDS.index(m.kind or classify_member(m.filename)),
+                int(m.ras_project),
+                m.extra_len,
+                len(name),
+            )
+        )
+        records.append(name)
+
+    header = struct.pack(
+        INDEX_HEADER_STRUCT,
+        INDEX_MAGIC,
+        INDEX_VERSION,
+        len(etag),
+        index.size,
+        index.cd_offset,
+        index.cd_size,
+        len(index.members),
+    )
+    return header + etag + zlib.compress(b"".join(records))
+
+
+def load_index(data: bytes) -> ZipIndex:
+    magic, version, etag_len, size, cd_offset, cd_size, count = struct.unpack(
+        INDEX_HEADER_STRUCT, data[:INDEX_HEADER_SIZE]
+    )
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError(f"unrecognized zip index (magic {magic}, version {version})")
+
+    etag = data[INDEX_HEADER_SIZE : INDEX_HEADER_SIZE + etag_len].decode()
+    body = zlib.decompress(data[INDEX_HEADER_SIZE + etag_len :])
+
+    members = []
+    pos = 0
+    for _ in range(count):
+        record = struct.unpack(INDEX_MEMBER_STRUCT, body[pos : pos + INDEX_MEMBER_SIZE])
+        pos += INDEX_MEMBER_SIZE
+        name_len = record[9]
+        members.append(
+            ZipMember(
+                filename=body[pos : pos + name_len].decode(),
+                header_offset=record[0],
+                compress_size=record[1],
+                file_size=record[2],
+                crc32=record[3],
+                compress_type=record[4],
+                flag_bits=record[5],
+                kind=MEMBER_KINDS[record[6]],
+                ras_project=bool(record[7]),
+                extra_len=record[8],
+            )
+        )
+        pos += name_len
+
+    return ZipIndex(
+        size=size, cd_offset=cd_offset, cd_size=cd_size, members=members, etag=etag
+    )
+
+
+def archive_fingerprint(fs, path: str) -> Tuple[int, str]:
+    """
+    Size and ETag of an archive from one HEAD request. Filesystems without
+    ETags (e.g. local files) fall back to modification time and size
+    """
+    info = fs.info(path)
+    etag = info.get("ETag") or info.get("etag")
+    if etag is None:
+        etag = f"{info.get('mtime', info.get('LastModified', ''))}-{info['size']}"
+    return info["size"], str(etag).strip('"')
+
+
+class ZipIndexCache:
+    """
+    Sidecar store for serialized indexes. `root` is a local directory or any
+    fsspec url (e.g. s3://bucket/stac/zip-index); entries are keyed by
+    bucket/key and only reused while the archive ETag matches
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip("/")
+        self.fs, self._root_path = fsspec.core.url_to_fs(self.root)
+
+    def path_for(self, bucket: str, key: str) -> str:
+        digest = hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest()
+        return f"{self._root_path}/{digest}.zidx"
+
+    def get(self, bucket: str, key: str, etag: str) -> ZipIndex:
+        path = self.path_for(bucket, key)
+        try:
+            if not self.fs.exists(path):
+                return None
+            index = load_index(self.fs.cat_file(path))
+        except Exception as e:
+            logging.warning(f"ZipIndexCache | unable to read {path}: {e}")
+            return None
+
+        if index.etag != etag:
+            logging.info(f"ZipIndexCache | {bucket}/{key}: ETag changed, rescanning")
+            return None
+        return index
+
+    def put(self, bucket: str, key: str, index: ZipIndex) -> None:
+        path = self.path_for(bucket, key)
+        try:
+            self.fs.makedirs(self._root_path, exist_ok=True)
+            self.fs.pipe_file(path, dump_index(index))
+        except Exception as e:
+            logging.warning(f"ZipIndexCache | unable to write {path}: {e}")
+
+    @classmethod
+    def from_env(cls, root: str = None):
+        root = root or os.getenv("FFRDCAT_ZIP_INDEX_CACHE")
+        if root:
+            return cls(root)
+        return None
@@ -1,8 +1,10 @@
-import boto3
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import fiona
 import geopandas as gpd
-from io import BytesIO
+from functools import partial
 import logging
+import multiprocessing
 from datetime import datetime, timezone
 import json
 import os
@@ -12,7 +14,6 @@ from shapely.geometry import mapping
 import s3fs
 from typing import Tuple
 import uuid
-import zipfile
 
 from .utils import (
     vsi_path,
@@ -23,17 +24,26 @@ from .utils import (
     bbox_to_4326,
     key_last_updated
 )
+from .clients import s3_client
 from .vectors import (
+    DEFAULT_BATCH_SIZE,
+    SAMPLE_FEATURES,
+    streaming_hull,
+    VectorProbe,
     vector_item_properties,
-    get_vector_meta,
-    approx_vector_size,
-    add_vector_thumbnail_asset_to_item,
+    make_vector_thumbnail,
     to_hull,
     STAC_VECTOR_EXTENSIONS,
 )
+from .footprints import DEFAULT_POINT_BUDGET, Footprint
 from .rasters import (
+    RASTER_FOOTPRINT_MODES,
+    THUMBNAIL_SIZE,
+    ThumbnailRead,
+    read_thumbnail,
+    valid_data_footprint,
     get_raster_meta,
-    add_raster_thumbnail_asset_to_item,
+    make_raster_thumbnail,
     raster_item_properties,
     STAC_RASTER_EXTENSIONS,
 )
@@ -43,6 +53,96 @@ from.ras_model import (
     ras_model_item_properties,
     STAC_RAS_MODEL_EXTENSIONS
 )
+from .admission import (
+    RASTER_MEMORY_GB,
+    AdmissionScheduler,
+    MemoryBudget,
+    default_memory_budget,
+    streaming_memory_gb,
+    vector_memory_gb,
+)
+from .gdal_env import effective_gdal_config, enter_gdal_env, layer_env
+from .mirror import ArchiveMirror
+from .incremental import (
+    SOURCE_PROPERTY,
+    PublishedItems,
+    member_fingerprint,
+    source_properties,
+)
+from .thumbnail_cache import THUMBNAIL_RENDERER, ThumbnailCache, publish_thumbnail
+from .timing import NULL_TIMER, ItemTimer, TimingRecorder
+from .uploads import S3Uploader, UploadBuffer
+from .zip_index import (
+    ZipIndex,
+    ZipIndexCache,
+    archive_fingerprint,
+    scan_central_directory,
+    read_member,
+)
+
+
+@dataclass
+class ItemOptions:
+    """
+    Item-building settings shared by every member of a collection (and sent
+    to worker processes)
+    """
+
+    raster_footprint: str = "valid_data"
+    thumbnail_cache: ThumbnailCache = None
+    point_budget: int = DEFAULT_POINT_BUDGET
+    hull_method: str = "auto"
+
+    def source_options(self, kind: str) -> dict:
+        """
+        Settings an item of this kind was rendered with, recorded in its
+        source properties so changing them rebuilds the item
+        """
+        if kind == "vector":
+            return {
+                "point_budget": self.point_budget,
+                "hull_method": self.hull_method,
+                "thumbnail": THUMBNAIL_RENDERER,
+                "thumbnail_size": THUMBNAIL_SIZE,
+            }
+        elif kind == "raster":
+            return {
+                "raster_footprint": self.raster_footprint,
+                "thumbnail": THUMBNAIL_RENDERER,
+                "thumbnail_size": THUMBNAIL_SIZE,
+            }
+        return {}
+
+
+# Layers estimated at or above this size in memory (GB) are read from a sample
+SAMPLE_LIMIT = 1.0
+
+LAYER_READ_MODES = ["in_memory", "streaming", "sampled"]
+
+# Ranged GETs in flight when sniffing `.prj` members for HEC-RAS projects
+PRJ_WORKERS = 16
+
+
+def layer_read_mode(
+    approx_size: float, mem_limit: float, sample_limit: float = SAMPLE_LIMIT
+) -> str:
+    """
+    Load layers that fit under `mem_limit`, stream the footprint of larger
+    ones, and sample the largest so they finish in a fixed time and memory
+    """
+    if approx_size >= sample_limit:
+        return "sampled"
+    elif approx_size >= mem_limit:
+        return "streaming"
+    return "in_memory"
+
+
+def layer_memory_gb(approx_size: float, nrows: int, mode: str) -> float:
+    if mode == "sampled":
+        return streaming_memory_gb(approx_size, nrows, SAMPLE_FEATURES)
+    elif mode == "streaming":
+        return streaming_memory_gb(approx_size, nrows, DEFAULT_BATCH_SIZE)
+    return approx_size
 
 
 class ZipReaderError(Exception):
@@ -57,7 +157,7 @@ class ZippedFGDB:
         self.key = key
         self.vsi_path = vsi_path(bucket, key)
         try:
-            with fiona.Env(session=session):
+            with layer_env(session):
                 self._contents = fiona.listlayers(self.vsi_path)
         except Exception as e:
             raise ZipReaderError(
@@ -74,47 +174,117 @@ class ZippedFGDB:
         collection_id: str,
         sess: fiona.session.AWSSession,
         mem_limit: float = 0.001,
+        workers: int = 1,
+        memory_budget: float = None,
+        sample_limit: float = SAMPLE_LIMIT,
     ) -> Tuple[Item, str]:
+        """
+        With workers > 1 layers are built in a process pool under a memory
+        budget (GB, default a share of the container limit): each layer is
+        admitted once its estimated in-memory size fits next to the layers
+        already running, largest first
+        """
         items, bboxes, extensions = [], [], []
 
+        if workers > 1:
+            results = self._process_layers_admitted(
+                project,
+                collection_id,
+                sess,
+                mem_limit,
+                sample_limit,
+                workers,
+                memory_budget,
+            )
+            for layer, item in zip(self.contents, results):
+                _add_item(item, layer, collection_id, items, bboxes, extensions)
+            return self._collection(collection_id, bboxes, extensions)
+
         for layer in self.contents:
-            zv = ZippedVector(self.bucket, self.key, layer, sess)
-            approx_size, nrows = approx_vector_size(zv.bucket, zv.key, zv.vector_name)
-            if approx_size < mem_limit:
+            zv = ZippedVector(
+                self.bucket, self.key, layer, self.contents, collection_id, None, sess
+            )
+            approx_size, nrows = zv.approx_size()
+            mode = layer_read_mode(approx_size, mem_limit, sample_limit)
+            if mode == "sampled":
                 logging.info(
-                    f"process_fgdb | {collection_id}:{zv.vector_name} initializeing processing: {nrows} rows ~ {approx_size} GB"
+                    f"process_fgdb | {collection_id}:{zv.vector_name} too large to read in full, sampling: {nrows} rows ~ {approx_size}GB"
+                )
+            elif mode == "streaming":
+                logging.info(
+                    f"process_fgdb | {collection_id}:{zv.vector_name} too large to load, streaming footprint: {nrows} rows ~ {approx_size}GB"
                 )
-                item, output_file = zipped_vector_to_item(project, zv, collection_id)
-                if isinstance(item, Item):
-                    try:
-                        items.append(item)
-                    except Exception as e:
-                        logging.warning(
-                            f"process_fgdb | {collection_id}:{zv.vector_name} cannot be added to collection items list"
-                        )
-
-                    try:
-                        bboxes.append(item.bbox)
-                    except Exception as e:
-                        logging.warning(
-                            f"process_fgdb | {collection_id}:{zv.vector_name} bbox cannot be added to collection bbox list"
-                        )
-
-                    try:
-                        extensions.extend(item.stac_extensions)
-                    except Exception as e:
-                        logging.warning(
-                            f"process_fgdb | {collection_id}:{zv.vector_name} extensions cannot be added to collection extension list"
-                        )
-                else:
-                    logging.warning(
-                        f"process_fgdb | {collection_id}:{zv.vector_name} | unable to process vector (skipping!)"
-                    )
             else:
-                logging.warning(
-                    f"process_fgdb | {collection_id}:{zv.vector_name} too large for processing: {nrows} rows ~ {approx_size}GB"
+                logging.info(
+                    f"process_fgdb | {collection_id}:{zv.vector_name} initializeing processing: {nrows} rows ~ {approx_size} GB"
+                )
+            try:
+                item = zipped_vector_to_item(
+                    project,
+                    zv,
+                    collection_id,
+                    streaming=mode == "streaming",
+                    sampled=mode == "sampled",
                 )
+            finally:
+                zv.close()
+            _add_item(item, zv.vector_name, collection_id, items, bboxes, extensions)
 
+        return self._collection(collection_id, bboxes, extensions)
+
+    def _process_layers_admitted(
+        self,
+        project: str,
+        collection_id: str,
+        sess: fiona.session.AWSSession,
+        mem_limit: float,
+        sample_limit: float,
+        workers: int,
+        memory_budget: float = None,
+    ):
+        tasks, costs = [], []
+        for layer in self.contents:
+            zv = ZippedVector(
+                self.bucket, self.key, layer, self.contents, collection_id, None, sess
+            )
+            try:
+                approx_size, nrows = zv.approx_size()
+            finally:
+                zv.close()
+            mode = layer_read_mode(approx_size, mem_limit, sample_limit)
+            tasks.append((layer, mode))
+            costs.append(layer_memory_gb(approx_size, nrows, mode))
+            logging.info(
+                f"process_fgdb | {collection_id}:{layer} {nrows} rows ~ {approx_size} GB, admitted at {costs[-1]} GB ({mode})"
+            )
+
+        budget = MemoryBudget(memory_budget or default_memory_budget())
+        logging.info(
+            f"process_fgdb | {collection_id}: {len(tasks)} layers on {workers} workers within {budget.budget:.2f} GB"
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_item_worker,
+            initargs=(None, _session_kwargs(sess), effective_gdal_config()),
+        )
+        scheduler = AdmissionScheduler(executor, budget)
+        build = partial(
+            _fgdb_layer_to_item_in_worker,
+            project,
+            self.bucket,
+            self.key,
+            self.contents,
+            collection_id,
+        )
+        try:
+            yield from scheduler.map(build, tasks, costs)
+        finally:
+            # On failure, do not wait for the layers still queued
+            scheduler.stop()
+            executor.shutdown(cancel_futures=True)
+
+    def _collection(self, collection_id: str, bboxes: list, extensions: list):
         collection_bbox = collection_bounding_boxes(bboxes)
 
         collection = Collection(
@@ -142,46 +312,137 @@ class ZippedFGDB:
         )
 
 
-def scan_s3_zip(fs: s3fs.S3FileSystem, s3_zip_file: str):
+def scan_s3_zip(fs: s3fs.S3FileSystem, s3_zip_file: str, index: ZipIndex = None):
+    """
+    List members from the central directory and sniff `.prj` files for HEC-RAS
+    projects. A `.prj` next to a `.shp` of the same name is the shapefile's
+    WKT and is not fetched; the others are read concurrently
+    """
+    if index is None:
+        index = scan_central_directory(fs, s3_zip_file)
+
     contents = []
-    ras_models = []
-    with fs.open(s3_zip_file, "rb") as zip_file:
-        with zipfile.ZipFile(BytesIO(zip_file.read())) as zip_ref:
-            info = zip_ref.infolist()
-            for i, file in enumerate(info):
-                logging.info(f"scan_s3_zip | {i} {file.filename}")
-                contents.append(file.filename)
-                if pl.Path(file.filename).suffix == ".prj":
-                    file_bytes = zip_ref.read(file.filename)
-                    logging.debug(
-                        f"scan_s3_zip | prj data for {file.filename}: {file_bytes.decode()}"
-                    )
-                    if "Proj Title" in file_bytes.decode():
-                        ras_models.append(file.filename)
+    shapefiles = set()
+    for i, member in enumerate(index.members):
+        logging.info(f"scan_s3_zip | {i} {member.filename}")
+        contents.append(member.filename)
+        if member.kind == "shapefile":
+            shapefiles.add(str(pl.PurePosixPath(member.filename).with_suffix("")))
+
+    candidates = [
+        m
+        for m in index.members
+        if m.kind == "prj"
+        and str(pl.PurePosixPath(m.filename).with_suffix("")) not in shapefiles
+    ]
+    if not candidates:
+        return contents, []
+
+    with ThreadPoolExecutor(
+        max_workers=min(PRJ_WORKERS, len(candidates)), thread_name_prefix="prj-sniff"
+    ) as executor:
+        prj_data = executor.map(
+            lambda member: read_member(fs, s3_zip_file, member), candidates
+        )
+        ras_models = []
+        for member, file_bytes in zip(candidates, prj_data):
+            text = file_bytes.decode(errors="replace")
+            logging.debug(f"scan_s3_zip | prj data for {member.filename}: {text}")
+            if "Proj Title" in text:
+                member.ras_project = True
+                ras_models.append(member.filename)
 
     return contents, ras_models
 
 
 class S3Zip:
-    def __init__(self, bucket: str, key: str, fs: s3fs.S3FileSystem):
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        fs: s3fs.S3FileSystem,
+        index_cache: str = None,
+        mirror: ArchiveMirror = None,
+    ):
         self.bucket = bucket
         self.key = key
-        self.vsi_path = (vsi_path(self.bucket, self.key),)
         self.fs = fs
+        self.mirror = mirror
+        self.vsi_path = (
+            vsi_path(self.bucket, self.key, local_path=self.local_path),
+        )
+        self.index_cache = ZipIndexCache.from_env(index_cache)
 
         try:
-            contents, ras_models = scan_s3_zip(self.fs, f"{self.bucket}/{self.key}")
-            self._contents = contents
-            self._ras_models = ras_models
+            self.index = self._load_index()
+            self._members = self.index.by_name()
+            self._contents = self.index.names
+            self._ras_models = [
+                m.filename for m in self.index.members if m.ras_project
+            ]
         except Exception as e:
             raise ZipReaderError(
                 f"Cannot read or list contents of {self.bucket}/{self.key}: {e}"
             )
 
+    def _load_index(self) -> ZipIndex:
+        """
+        Reuse the sidecar index while the archive ETag is unchanged, otherwise
+        scan the central directory and sniff `.prj` files, then persist
+        """
+        s3_zip_file = f"{self.bucket}/{self.key}"
+        size, etag = archive_fingerprint(self.fs, s3_zip_file)
+
+        if self.index_cache is not None:
+            index = self.index_cache.get(self.bucket, self.key, etag)
+            if index is not None:
+                logging.info(f"S3Zip | {s3_zip_file}: loaded cached index ({etag})")
+                return index
+
+        index = scan_central_directory(self.archive_fs, self.archive_path, size)
+        index.etag = etag
+        scan_s3_zip(self.archive_fs, self.archive_path, index)
+
+        if self.index_cache is not None:
+            self.index_cache.put(self.bucket, self.key, index)
+        return index
+
+    def use_mirror(self, mirror: ArchiveMirror) -> None:
+        """
+        Read members from a local mirror from here on; the index is already
+        loaded, so the mirror can be chosen after the incremental check
+        """
+        self.mirror = mirror
+        self.vsi_path = (
+            vsi_path(self.bucket, self.key, local_path=self.local_path),
+        )
+
+    @property
+    def local_path(self) -> str:
+        return self.mirror.path if self.mirror is not None else None
+
+    @property
+    def archive_fs(self):
+        """
+        Where member bytes are read from: the local mirror when there is one
+        """
+        return self.mirror if self.mirror is not None else self.fs
+
+    @property
+    def archive_path(self) -> str:
+        return self.local_path or f"{self.bucket}/{self.key}"
+
     @property
     def contents(self):
         return self._contents
 
+    @property
+    def members(self):
+        """
+        Return central directory entries keyed by member name
+        """
+        return self._members
+
     @property
     def unique_file_extensions(self):
         """
@@ -255,6 +516,47 @@ class S3Zip:
             if f[:-4] == filename[:-4] and pl.Path(f).suffix != ".shp"
         ]
 
+    @property
+    def item_members(self) -> list:
+        """
+        (kind, member) of every member an item is built from
+        """
+        return (
+            [("vector", f) for f in self.shapefiles]
+            + [("raster", f) for f in self.rasters]
+            + [("ras_model", f) for f in self.ras_models]
+        )
+
+    def source_members(self, kind: str, member: str) -> list:
+        """
+        Members an item is built from: the shapefile parts, the raster and
+        its sidecars (.tfw, .aux.xml, .ovr), or the files of a ras model
+        """
+        if kind == "vector":
+            return [member] + self.shapefile_parts(member)
+        elif kind == "raster":
+            stem = str(pl.Path(member).with_suffix(""))
+            return [f for f in self.contents if f == member or f.startswith(f"{stem}.")]
+        elif kind == "ras_model":
+            model_files = self.zipped_ras_model(member, None, None).ras_model_files
+            return model_files["other_files"] + model_files["geometry_files"]
+        raise ValueError(f"unknown member kind `{kind}`")
+
+    def memory_estimate(self, kind: str, member: str) -> float:
+        """
+        In-memory size (GB) of building the item, from central directory
+        sizes alone: vectors scale with the .shp, rasters are read at
+        thumbnail size
+        """
+        if kind == "vector":
+            return vector_memory_gb(self.members[member].file_size)
+        elif kind == "raster":
+            return RASTER_MEMORY_GB
+        return 0.0
+
+    def fingerprint(self, kind: str, member: str) -> dict:
+        return member_fingerprint(self.members, self.source_members(kind, member))
+
     def zipped_ras_model(self, ras_prj_file: str, collection_id: str, session: any):
         return ZippedRASModel(
             bucket=self.bucket,
@@ -262,8 +564,10 @@ class S3Zip:
             ras_prj_file=ras_prj_file,
             collection_id=collection_id,
             contents=self.contents,
-            fs=self.fs,
+            fs=self.archive_fs,
             session=session,
+            members=self.members,
+            archive_path=self.archive_path,
         )
 
     def zipped_vector(self, vector_name: str, collection_id: str, session: any):
@@ -275,6 +579,7 @@ class S3Zip:
             collection_id=collection_id,
             fs=self.fs,
             session=session,
+            local_path=self.local_path,
         )
 
     def __repr__(self):
@@ -305,6 +610,7 @@ class ZippedVector:
         collection_id: str,
         fs: s3fs.S3FileSystem,
         session: fiona.session.AWSSession,
+        local_path: str = None,
     ):
         self.bucket = bucket
         self.key = key
@@ -313,33 +619,48 @@ class ZippedVector:
         self.collection_id = collection_id
         self.fs = fs
         self._fiona_session = session
+        self.footprint_meta = None
+        self.footprint_points = None
+        self._geometry_4326 = None
 
         if vector_name.endswith(".shp"):
             self.store = "shapefile"
-            self.vsi_path = vsi_path(self.bucket, self.key, self.vector_name)
-            with fiona.Env(session=self._fiona_session):
-                try:
-                    self.meta_data = get_vector_meta(self.vsi_path)
-                    self.meta_data.shapefile_parts = self.shapefile_parts
-                except Exception as e:
-                    logging.error(
-                        f"ZippedVector | failed reading metadata shapefile {self.vector_name}: {e}"
-                    )
-                    raise LookupError(e)
+            self.vsi_path = vsi_path(
+                self.bucket, self.key, self.vector_name, local_path=local_path
+            )
+            try:
+                self.probe = VectorProbe(self.vsi_path, session=self._fiona_session)
+                self.meta_data = self.probe.meta
+                self.meta_data.shapefile_parts = self.shapefile_parts
+            except Exception as e:
+                logging.error(
+                    f"ZippedVector | failed reading metadata shapefile {self.vector_name}: {e}"
+                )
+                raise LookupError(e)
         else:
-            self.vsi_path = vsi_path(self.bucket, self.key)
+            self.vsi_path = vsi_path(self.bucket, self.key, local_path=local_path)
             self.store = "fgdb"
             try:
-                self.meta_data = get_vector_meta(self.vsi_path, layer=self.vector_name)
+                self.probe = VectorProbe(
+                    self.vsi_path, layer=self.vector_name, session=self._fiona_session
+                )
+                self.meta_data = self.probe.meta
             except Exception as e:
                 logging.error(
                     f"ZippedVector | failed reading metadata from gdb layer {self.vector_name}: {e}"
                 )
                 raise LookupError(e)
 
+    def approx_size(self) -> tuple:
+        return self.probe.approx_size()
+
+    def close(self):
+        self._geometry_4326 = None
+        self.probe.close()
+
     @property
     def s3_client(self):
-        return boto3.client("s3")
+        return s3_client()
 
     @property
     def bbox(self):
@@ -349,26 +670,66 @@ class ZippedVector:
     def projection(self):
         return self.meta_data.projection
 
-    def footprint(self):
+    def footprint(
+        self,
+        point_budget: int = DEFAULT_POINT_BUDGET,
+        method: str = "auto",
+        streaming: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        sampled: bool = False,
+        timer: ItemTimer = NULL_TIMER,
+    ):
+        """
+        Returns the footprint geometry; how it was derived is kept in
+        `footprint_meta` for the item properties. With `streaming` the layer
+        is read in batches and the vertices retained for the hull are kept in
+        `footprint_points`; `sampled` does the same over a spatially
+        stratified sample of the features
+        """
         logging.debug(
             f"footprint | {self.vector_name}: {footprint_from_bbox(self.bbox, self.projection)}"
         )
         if footprint_from_bbox(self.bbox, self.projection).within(texas_bbox()):
             try:
-                return to_hull(self.as_gdf())
+                if sampled:
+                    self.footprint_meta, self.footprint_points = streaming_hull(
+                        self.probe.iter_sampled_geometry_batches(
+                            batch_size=batch_size
+                        ),
+                        self.projection,
+                        point_budget=point_budget,
+                        method=method,
+                        timer=timer,
+                    )
+                    self.footprint_meta.mode = "sampled"
+                elif streaming:
+                    self.footprint_meta, self.footprint_points = streaming_hull(
+                        self.probe.iter_geometry_batches(batch_size),
+                        self.projection,
+                        point_budget=point_budget,
+                        method=method,
+                        timer=timer,
+                    )
+                else:
+                    self.footprint_meta = to_hull(
+                        self.geometry_4326(timer), point_budget, method
+                    )
             except:
                 logging.warning(
                     f"footprint | {self.vector_name}: unable to simplfy geometry: defaulting to state bbox"
                 )
-                return texas_bbox()
+                self.footprint_meta = Footprint(texas_bbox(), "state_bbox")
         else:
             logging.warning(
                 f"footprint | {self.vector_name}: data not properly constrained to state: need to clip"
             )
             try:
-                return footprint_from_bbox(self.bbox, self.projection)
+                self.footprint_meta = Footprint(
+                    footprint_from_bbox(self.bbox, self.projection), "bbox"
+                )
             except:
-                return us_bbox()
+                self.footprint_meta = Footprint(us_bbox(), "us_bbox")
+        return self.footprint_meta.geometry
 
     @property
     def bbox_4326(self):
@@ -382,18 +743,21 @@ class ZippedVector:
     def geom_type(self):
         return self.meta_data.geom_type
 
-    def as_gdf(self):
-        if self.store == "fgdb":
-            with fiona.open(
-                f"zip+s3://{self.bucket}/{self.key}", layer=self.vector_name
-            ) as src:
-                gdf = gpd.GeoDataFrame.from_features(
-                    [feature for feature in src], crs=self.projection
-                )
-        else:
-            gdf = gpd.read_file(f"zip+s3://{self.bucket}/{self.key}/{self.vector_name}")
-            gdf.crs = self.projection
-        return gdf
+    def as_gdf(self, columns: list = None):
+        return self.probe.read_gdf(columns=columns)
+
+    def geometry_4326(self, timer: ItemTimer = NULL_TIMER) -> gpd.GeoDataFrame:
+        """
+        Geometry-only read in the native CRS, reprojected once and cached so
+        the footprint, thumbnail and any statistics share one load
+        """
+        if self._geometry_4326 is None:
+            with timer.stage("load"):
+                geometry = self.probe.read_geometry()
+            with timer.stage("reproject"):
+                geometry = geometry.to_crs("epsg:4326")
+            self._geometry_4326 = gpd.GeoDataFrame(geometry=geometry)
+        return self._geometry_4326
 
     def shapefile_parts(self):
         """
@@ -444,11 +808,31 @@ def zipped_vector_to_item(
     project: str,
     zv: ZippedVector,
     collection_id: str,
+    uploader: S3Uploader = None,
+    streaming: bool = False,
+    sampled: bool = False,
+    thumbnail_cache: ThumbnailCache = None,
+    source: dict = None,
+    timer: ItemTimer = NULL_TIMER,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    hull_method: str = "auto",
 ) -> Item:
-    approx_size, nrows = approx_vector_size(zv.bucket, zv.key, zv.vector_name)
+    """
+    `streaming` builds the footprint from batched reads instead of loading the
+    layer, for layers too large to hold in memory. `sampled` builds it (and
+    the thumbnail) from a bounded sample of the features, for the largest
+    layers; the item keeps the header bounds and feature count and records
+    the sample under `FFRD:sampled`.
+
+    `thumbnail_cache` and `source` are handed to `publish_thumbnail`;
+    `timer` records the time spent in each stage
+    """
+    with timer.stage("size_estimate"):
+        approx_size, nrows = zv.approx_size()
 
     try:
-        properties = vector_item_properties(project, fields=zv.meta_data.fields)
+        with timer.stage("metadata"):
+            properties = vector_item_properties(project, fields=zv.meta_data.fields)
 
         if not properties:
             return None, None
@@ -463,20 +847,30 @@ def zipped_vector_to_item(
         )
         return None, None
 
-    try:
-        gdf = zv.as_gdf()
-        gdf = gdf.to_crs("epsg:4326")
-        logging.info(
-            f"zipped_vector_to_item | `{zv.vector_name}`: converted to geodataframe (4326)"
-        )
-    except Exception as e:
-        logging.error(
-            f"zipped_vector_to_item | `{zv.vector_name}`: unable to convert to geodataframe (4326)"
-        )
-        raise ZipReaderError(e)
+    if not streaming and not sampled:
+        try:
+            gdf = zv.geometry_4326(timer)
+            logging.info(
+                f"zipped_vector_to_item | `{zv.vector_name}`: converted to geodataframe (4326)"
+            )
+        except Exception as e:
+            logging.error(
+                f"zipped_vector_to_item | `{zv.vector_name}`: unable to convert to geodataframe (4326)"
+            )
+            raise ZipReaderError(e)
 
     try:
-        footprint = zv.footprint()
+        with timer.stage("hull"):
+            footprint = zv.footprint(
+                point_budget,
+                hull_method,
+                streaming=streaming,
+                sampled=sampled,
+                timer=timer,
+            )
+        properties["FFRD:footprint"] = zv.footprint_meta.properties
+        if sampled:
+            properties["FFRD:sampled"] = getattr(zv.probe, "sample_info", None)
         logging.info(f"zipped_vector_to_item | `{zv.vector_name}`: created footprint")
     except Exception as e:
         logging.error(
@@ -484,8 +878,17 @@ def zipped_vector_to_item(
         )
         raise ZipReaderError(e)
 
+    if streaming or sampled:
+        # The thumbnail shows the decimated vertices retained for the hull
+        if zv.footprint_points is not None:
+            geometry = gpd.points_from_xy(*zv.footprint_points.T)
+        else:
+            geometry = [footprint]
+        gdf = gpd.GeoDataFrame(geometry=geometry, crs="epsg:4326")
+
     try:
-        bbox = zv.bbox_4326
+        with timer.stage("metadata"):
+            bbox = zv.bbox_4326
         logging.info(f"zipped_vector_to_item | `{zv.vector_name}`: created bbox (4326)")
     except Exception as e:
         logging.error(
@@ -505,7 +908,8 @@ def zipped_vector_to_item(
         raise ZipReaderError(e)
 
     try:
-        dtm = key_last_updated(zv.bucket, zv.key)
+        with timer.stage("metadata"):
+            dtm = key_last_updated(zv.bucket, zv.key)
         logging.info(
             f"zipped_vector_to_item | `{zv.vector_name}`: last update time accessed: `{dtm}`"
         )
@@ -545,15 +949,26 @@ def zipped_vector_to_item(
         )
         raise ZipReaderError(e)
 
+    thumbnail_key = f"stac/collections/{collection_id}/{item.id}-thumbnail.png"
     try:
-        thumbnail_key = f"stac/collections/{collection_id}/{item.id}-thumbnail.png"
-        item_with_thumbnail = add_vector_thumbnail_asset_to_item(
-            gdf, footprint, zv.bucket, thumbnail_key, item
+        # Point counts vary between sampled reads, so they stay out of the key
+        footprint_key = {
+            k: zv.footprint_meta.properties[k]
+            for k in ["mode", "method", "point_budget"]
+        }
+        item, thumbnail_key, cached = publish_thumbnail(
+            item,
+            zv.bucket,
+            thumbnail_key,
+            {"kind": "vector", "size": THUMBNAIL_SIZE, "footprint": footprint_key},
+            lambda: make_vector_thumbnail(gdf, footprint),
+            uploader,
+            thumbnail_cache,
+            source,
+            timer,
         )
-        item, png = item_with_thumbnail
-        zv.s3_client.put_object(Body=png, Bucket=zv.bucket, Key=thumbnail_key)
         logging.info(
-            f"zipped_vector_to_item | `{zv.vector_name}`: added thumbnail asset: {thumbnail_key}"
+            f"zipped_vector_to_item | `{zv.vector_name}`: added thumbnail asset: {thumbnail_key} (cached: {cached})"
         )
     except Exception as e:
         logging.error(
@@ -572,17 +987,48 @@ def zipped_vector_to_item(
 
 
 class ZippedRaster:
-    def __init__(self, bucket: str, key: str, file_name: str, collection_id: str):
+    """
+    footprint_mode `valid_data` outlines the pixels holding data, `bbox`
+    uses the transformed bounds. The raster is read once at thumbnail size
+    (`thumbnail_read`) for both the valid-data outline and the thumbnail.
+    `local_path` reads from a local mirror of the archive
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        file_name: str,
+        collection_id: str,
+        footprint_mode: str = "valid_data",
+        local_path: str = None,
+    ):
+        if footprint_mode not in RASTER_FOOTPRINT_MODES:
+            raise ValueError(
+                f"footprint_mode must be one of {RASTER_FOOTPRINT_MODES} not `{footprint_mode}`"
+            )
         self.bucket = bucket
         self.key = key
         self.file_name = file_name
         self.collection_id = collection_id
-        self.vsi_path = vsi_path(self.bucket, self.key, self.file_name)
+        self.footprint_mode = footprint_mode
+        self.vsi_path = vsi_path(
+            self.bucket, self.key, self.file_name, local_path=local_path
+        )
         self.meta_data = get_raster_meta(self.vsi_path)
+        self._footprint = None
+        self._thumbnail_read = None
+        self.footprint_meta = None
+
+    @property
+    def thumbnail_read(self) -> ThumbnailRead:
+        if self._thumbnail_read is None:
+            self._thumbnail_read = read_thumbnail(self.vsi_path)
+        return self._thumbnail_read
 
     @property
     def s3_client(self):
-        return boto3.client("s3")
+        return s3_client()
 
     @property
     def bbox(self):
@@ -594,7 +1040,22 @@ class ZippedRaster:
 
     @property
     def footprint(self):
-        return footprint_from_bbox(self.meta_data.bbox, self.projection)
+        if self._footprint is not None:
+            return self._footprint
+
+        if self.footprint_mode == "valid_data":
+            try:
+                self._footprint = valid_data_footprint(self.thumbnail_read)
+                self.footprint_meta = {"mode": "valid_data", "max_size": THUMBNAIL_SIZE}
+                return self._footprint
+            except Exception as e:
+                logging.warning(
+                    f"footprint | {self.file_name}: unable to outline valid data, defaulting to bbox: {e}"
+                )
+
+        self._footprint = footprint_from_bbox(self.meta_data.bbox, self.projection)
+        self.footprint_meta = {"mode": "bbox"}
+        return self._footprint
 
     @property
     def bbox_4326(self):
@@ -638,9 +1099,17 @@ def zipped_raster_to_item(
     project: str,
     zr: ZippedRaster,
     collection_id: str,
+    uploader: S3Uploader = None,
+    thumbnail_cache: ThumbnailCache = None,
+    source: dict = None,
+    timer: ItemTimer = NULL_TIMER,
 ) -> Item:
+    """
+    Thumbnail options and `timer` as for `zipped_vector_to_item`
+    """
     try:
-        properties = raster_item_properties(project, zr.projection, zr.resoultion)
+        with timer.stage("metadata"):
+            properties = raster_item_properties(project, zr.projection, zr.resoultion)
         logging.info(
             f"zipped_raster_to_item | `{zr.file_name}`: retrieved raster properties"
         )
@@ -657,7 +1126,8 @@ def zipped_raster_to_item(
         raise ZipReaderError(e)
 
     try:
-        dtm = key_last_updated(zr.bucket, zr.key)
+        with timer.stage("metadata"):
+            dtm = key_last_updated(zr.bucket, zr.key)
         logging.info(
             f"zipped_raster_to_item | `{zr.file_name}`: last update time accessed: `{dtm}`"
         )
@@ -668,7 +1138,10 @@ def zipped_raster_to_item(
         raise ZipReaderError(e)
 
     try:
+        with timer.stage("hull"):
+            zr.footprint  # outlined once, cached for the item geometry
         item = zr.to_stac_item(item_id, dtm, properties)
+        item.properties["FFRD:footprint"] = zr.footprint_meta
         logging.info(f"zipped_raster_to_item | `{zr.file_name}`: created pystac.Item")
     except Exception as e:
         logging.error(f"zipped_raster_to_item | `{zr.file_name}`: created pystac.Item")
@@ -692,15 +1165,21 @@ def zipped_raster_to_item(
         )
         raise ZipReaderError(e)
 
+    thumbnail_key = f"stac/collections/{collection_id}/{item.id}-thumbnail.png"
     try:
-        thumbnail_key = f"stac/collections/{collection_id}/{item.id}-thumbnail.png"
-        item_with_thumbnail = add_raster_thumbnail_asset_to_item(
-            zr.vsi_path, zr.bucket, thumbnail_key, item
+        item, thumbnail_key, cached = publish_thumbnail(
+            item,
+            zr.bucket,
+            thumbnail_key,
+            {"kind": "raster", "size": THUMBNAIL_SIZE, "cmap": "inferno"},
+            lambda: make_raster_thumbnail(zr.thumbnail_read),
+            uploader,
+            thumbnail_cache,
+            source,
+            timer,
         )
-        item, png = item_with_thumbnail
-        zr.s3_client.put_object(Body=png, Bucket=zr.bucket, Key=thumbnail_key)
         logging.info(
-            f"zipped_raster_to_item | `{zr.file_name}`: added thumbnail asset: {thumbnail_key}"
+            f"zipped_raster_to_item | `{zr.file_name}`: added thumbnail asset: {thumbnail_key} (cached: {cached})"
         )
     except Exception as e:
         logging.error(
@@ -730,6 +1209,8 @@ class ZippedRASModel:
         collection_id: str,
         fs: s3fs.S3FileSystem,
         session: fiona.session.AWSSession,
+        members: dict = None,
+        archive_path: str = None,
     ):
         self.bucket = bucket
         self.key = key
@@ -738,9 +1219,10 @@ class ZippedRASModel:
         self.collection_id = collection_id
         self.fs = fs
         self._fiona_session = session
+        self.members = members or {}
 
         try:
-            self.vsi_path = f"{self.bucket}/{self.key}"
+            self.vsi_path = archive_path or f"{self.bucket}/{self.key}"
         except Exception as e:
             logging.error(
                 f"ZippedRASModel | failed reading metadata {self.ras_prj_file}: {e}"
@@ -774,7 +1256,9 @@ class ZippedRASModel:
         return self.ras_model_files["other_files"]
     
     def geometry_meta(self, filename:str):
-        return get_ras_model_meta(self.fs, self.vsi_path, filename)
+        return get_ras_model_meta(
+            self.fs, self.vsi_path, filename, self.members.get(filename)
+        )
     
     def bbox_4326(self, bbox:list, projection: str):
         return bbox_to_4326(bbox, projection)
@@ -815,10 +1299,17 @@ class ZippedRASModel:
         )
 
 
-def zipped_ras_model_to_item(project:str, zrm:ZippedRASModel, collection_id:str, projection:str):
+def zipped_ras_model_to_item(
+    project: str,
+    zrm: ZippedRASModel,
+    collection_id: str,
+    projection: str,
+    timer: ItemTimer = NULL_TIMER,
+):
     try:
         g = zrm.geometry_files[0]
-        meta = zrm.geometry_meta(g)
+        with timer.stage("metadata"):
+            meta = zrm.geometry_meta(g)
         logging.info(
             f"zipped_ras_model_to_item | `{zrm.ras_prj_file}`: retrieved ras geometry file"
         )
@@ -828,8 +1319,9 @@ def zipped_ras_model_to_item(project:str, zrm:ZippedRASModel, collection_id:str,
         )
         
     try:
-        bbox4326 = zrm.bbox_4326(meta.bbox, projection)
-        footprint = mapping(footprint_from_bbox(bbox4326, projection))
+        with timer.stage("reproject"):
+            bbox4326 = zrm.bbox_4326(meta.bbox, projection)
+            footprint = mapping(footprint_from_bbox(bbox4326, projection))
         logging.info(f"zipped_ras_model_to_item | `{zrm.ras_prj_file}`: created first guess at raster bbox: {bbox4326}"
         )
     except Exception as e:
@@ -849,7 +1341,8 @@ def zipped_ras_model_to_item(project:str, zrm:ZippedRASModel, collection_id:str,
         raise ZipReaderError(e)
 
     try:
-        dtm = key_last_updated(zrm.bucket, zrm.key)
+        with timer.stage("metadata"):
+            dtm = key_last_updated(zrm.bucket, zrm.key)
         logging.info(
             f"zipped_ras_model_to_item | `{zrm.ras_prj_file}`: last update time accessed: `{dtm}`"
         )
@@ -860,7 +1353,6 @@ def zipped_ras_model_to_item(project:str, zrm:ZippedRASModel, collection_id:str,
         raise ZipReaderError(e)
     
     try:
-        dtm =  datetime.now(tz=timezone.utc)
         properties = ras_model_item_properties(project)
         item = zrm.to_stac_item(
                 item_id,
@@ -920,124 +1412,390 @@ def zipped_ras_model_to_item(project:str, zrm:ZippedRASModel, collection_id:str,
     return item
         
 
-def new_collection_from_zip(
+def _session_kwargs(sess: fiona.session.AWSSession) -> dict:
+    """
+    Constructor arguments to rebuild an AWSSession in a worker process
+    """
+    renames = {"aws_region": "region_name", "aws_s3_endpoint": "endpoint_url"}
+    return {
+        renames.get(k, k): v
+        for k, v in sess.credentials.items()
+        if k != "aws_request_payer"
+    }
+
+
+def item_from_member(
     project: str,
     z: S3Zip,
     collection_id: str,
-    collection_title: str,
     sess: fiona.session.AWSSession,
-) -> Tuple[Item, str]:
-    items, bboxes, extensions, projections = [], [], [], []
-    all_ras_model_files = []
-    for shapefile in z.shapefiles:
-        try:
-            zv = z.zipped_vector(shapefile, collection_id, sess)
-            projections.append(zv.meta_data.projection)
-        except LookupError:
-            continue
+    kind: str,
+    member: str,
+    projection: str = None,
+    uploader: S3Uploader = None,
+    options: ItemOptions = None,
+    timer: ItemTimer = NULL_TIMER,
+):
+    """
+    Build the item for one member of the zip. Returns (item, projection, ras
+    model files), or None when the member cannot be read. Items record the
+    CRC32/size of the members they were built from, and the options they
+    were rendered with, for incremental runs
+    """
+    options = options or ItemOptions()
+    result = _build_item_from_member(
+        project,
+        z,
+        collection_id,
+        sess,
+        kind,
+        member,
+        projection,
+        uploader,
+        options,
+        timer,
+    )
+    if result is not None and isinstance(result[0], Item):
+        item, item_projection, _ = result
+        item.properties[SOURCE_PROPERTY] = source_properties(
+            member,
+            z.fingerprint(kind, member),
+            item_projection,
+            options.source_options(kind),
+        )
+    return result
 
-        item = zipped_vector_to_item(project, zv, collection_id)
 
-        if isinstance(item, Item):
-            try:
-                items.append(item)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zv.vector_name} cannot be added to collection items list"
-                )
+def pending_members(
+    z: S3Zip, previous: PublishedItems = None, options: ItemOptions = None
+) -> list:
+    """
+    (kind, member) of the items a run would build rather than carry forward
+    """
+    options = options or ItemOptions()
+    return [
+        (kind, member)
+        for kind, member in z.item_members
+        if previous is None
+        or not previous.unchanged(
+            member, z.fingerprint(kind, member), options.source_options(kind)
+        )
+    ]
 
-            try:
-                bboxes.append(item.bbox)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zv.vector_name} bbox cannot be added to collection bbox list"
-                )
 
-            try:
-                extensions.extend(item.stac_extensions)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zv.vector_name} extensions cannot be added to collection extension list"
-                )
+def carried_forward_result(kind: str, item: Item):
+    """
+    The (item, projection, ras model files) an unchanged item would have
+    produced, rebuilt from its source properties
+    """
+    source = item.properties[SOURCE_PROPERTY]
+    if kind == "ras_model":
+        return item, None, list(source["members"])
+    return item, source.get("projection"), []
 
-        else:
-            logging.warning(
-                f"process_collection | {collection_title}:{zv.vector_name} | unable to process vector (skipping!)"
+
+def _build_item_from_member(
+    project: str,
+    z: S3Zip,
+    collection_id: str,
+    sess: fiona.session.AWSSession,
+    kind: str,
+    member: str,
+    projection: str = None,
+    uploader: S3Uploader = None,
+    options: ItemOptions = None,
+    timer: ItemTimer = NULL_TIMER,
+):
+    options = options or ItemOptions()
+    if kind == "vector":
+        try:
+            with timer.stage("metadata"):
+                zv = z.zipped_vector(member, collection_id, sess)
+        except LookupError:
+            return None
+        try:
+            item = zipped_vector_to_item(
+                project,
+                zv,
+                collection_id,
+                uploader,
+                thumbnail_cache=options.thumbnail_cache,
+                source=z.fingerprint(kind, member),
+                timer=timer,
+                point_budget=options.point_budget,
+                hull_method=options.hull_method,
             )
+        finally:
+            zv.close()
+        return item, zv.meta_data.projection, []
 
-    for raster in z.rasters:
+    elif kind == "raster":
         try:
-            zr = ZippedRaster(z.bucket, z.key, raster, collection_id)
+            with timer.stage("metadata"):
+                zr = ZippedRaster(
+                    z.bucket,
+                    z.key,
+                    member,
+                    collection_id,
+                    footprint_mode=options.raster_footprint,
+                    local_path=z.local_path,
+                )
         except LookupError:
-            continue
+            return None
+        item = zipped_raster_to_item(
+            project,
+            zr,
+            collection_id,
+            uploader,
+            thumbnail_cache=options.thumbnail_cache,
+            source=z.fingerprint(kind, member),
+            timer=timer,
+        )
+        return item, None, []
 
-        item = zipped_raster_to_item(project, zr, collection_id)
+    elif kind == "ras_model":
+        try:
+            with timer.stage("metadata"):
+                zrm = z.zipped_ras_model(member, collection_id, sess)
+        except LookupError:
+            return None
+        item = zipped_ras_model_to_item(
+            project, zrm, collection_id, projection, timer=timer
+        )
+        model_files = zrm.ras_model_files
+        return item, None, model_files["other_files"] + model_files["geometry_files"]
 
-        if isinstance(item, Item):
-            try:
-                items.append(item)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zr.file_name} cannot be added to collection items list"
-                )
+    raise ValueError(f"unknown member kind `{kind}`")
 
-            try:
-                bboxes.append(item.bbox)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zr.file_name} bbox cannot be added to collection bbox list"
-                )
 
-            try:
-                extensions.extend(item.stac_extensions)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{zr.file_name} extensions cannot be added to collection extension list"
-                )
+_worker_state = {}
 
-        else:
-            logging.warning(
-                f"process_collection | {collection_title}:{zr.file_name} | unable to process vector (skipping!)"
-            )
 
-    for model in z.ras_models:
-        try:
-            zrm = z.zipped_ras_model(model, collection_id, sess)
-        except LookupError:
-            continue
+def _fgdb_layer_to_item_in_worker(
+    project: str,
+    bucket: str,
+    key: str,
+    contents: list,
+    collection_id: str,
+    task: tuple,
+):
+    layer, mode = task
+    zv = ZippedVector(
+        bucket, key, layer, contents, collection_id, None, _worker_state["sess"]
+    )
+    try:
+        return zipped_vector_to_item(
+            project,
+            zv,
+            collection_id,
+            streaming=mode == "streaming",
+            sampled=mode == "sampled",
+        )
+    finally:
+        zv.close()
 
-        use_first_projection = projections[0]
-        item = zipped_ras_model_to_item(project, zrm, collection_id, use_first_projection)
 
-        if isinstance(item, Item):
-            try:
-                items.append(item)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{model} cannot be added to collection items list"
-                )
+def _init_item_worker(z: S3Zip, session_kwargs: dict, gdal_config: dict = None):
+    _worker_state["z"] = z
+    _worker_state["sess"] = fiona.session.AWSSession(**session_kwargs)
+    if gdal_config is not None:
+        enter_gdal_env(gdal_config, _worker_state["sess"])
 
-            try:
-                bboxes.append(item.bbox)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{model} bbox cannot be added to collection bbox list"
-                )
 
-            try:
-                extensions.extend(item.stac_extensions)
-            except Exception as e:
-                logging.warning(
-                    f"process_collection | {collection_title}:{model} extensions cannot be added to collection extension list"
-                )
+def _item_from_member_in_worker(
+    project: str,
+    collection_id: str,
+    options: ItemOptions,
+    buffer_uploads: bool,
+    timed: bool,
+    task: tuple,
+):
+    """
+    With `buffer_uploads` thumbnails are returned to the parent for its
+    uploader, otherwise the worker puts them itself. With `timed` the stage
+    timings of the item are returned as well
+    """
+    uploads = UploadBuffer() if buffer_uploads else None
+    timer = ItemTimer(task[1], task[0]) if timed else NULL_TIMER
+    result = item_from_member(
+        project,
+        _worker_state["z"],
+        collection_id,
+        _worker_state["sess"],
+        *task,
+        uploader=uploads,
+        options=options,
+        timer=timer,
+    )
+    return result, uploads, timer.finish() if timed else None
 
-            all_ras_model_files.extend(zrm.ras_model_files["other_files"])
-            all_ras_model_files.extend(zrm.ras_model_files["geometry_files"])
 
-        else:
-            logging.warning(
-                f"process_collection | {collection_title}:{model} | unable to process ras model (skipping!)"
+def _add_item(
+    item: Item,
+    member: str,
+    collection_title: str,
+    items: list,
+    bboxes: list,
+    extensions: list,
+) -> bool:
+    if not isinstance(item, Item):
+        logging.warning(
+            f"process_collection | {collection_title}:{member} | unable to process item (skipping!)"
+        )
+        return False
+
+    try:
+        items.append(item)
+    except Exception as e:
+        logging.warning(
+            f"process_collection | {collection_title}:{member} cannot be added to collection items list"
+        )
+
+    try:
+        bboxes.append(item.bbox)
+    except Exception as e:
+        logging.warning(
+            f"process_collection | {collection_title}:{member} bbox cannot be added to collection bbox list"
+        )
+
+    try:
+        extensions.extend(item.stac_extensions)
+    except Exception as e:
+        logging.warning(
+            f"process_collection | {collection_title}:{member} extensions cannot be added to collection extension list"
+        )
+    return True
+
+
+def new_collection_from_zip(
+    project: str,
+    z: S3Zip,
+    collection_id: str,
+    collection_title: str,
+    sess: fiona.session.AWSSession,
+    workers: int = 1,
+    uploader: S3Uploader = None,
+    options: ItemOptions = None,
+    previous: PublishedItems = None,
+    memory_budget: float = None,
+    timings: TimingRecorder = None,
+) -> Tuple[Item, str]:
+    """
+    With workers > 1 items are built in a process pool; results are merged in
+    member order so the collection is identical to a serial run. Thumbnails go
+    through `uploader` when given, overlapping uploads with item generation.
+
+    With `previous` (items from an earlier run) only members whose CRC32 or
+    size changed are rebuilt; unchanged items and their thumbnails are
+    carried forward.
+
+    In the process pool, members are admitted largest first while their
+    estimated memory fits in `memory_budget` (GB, default a share of the
+    container limit)
+
+    With `timings` the wall and CPU time of each stage of every built item
+    is recorded (carried-forward items are not timed)
+    """
+    options = options or ItemOptions()
+    items, bboxes, extensions, projections = [], [], [], []
+    all_ras_model_files = []
+
+    tasks = [("vector", f) for f in z.shapefiles] + [("raster", f) for f in z.rasters]
+
+    if workers > 1:
+        logging.info(
+            f"process_collection | {collection_title}: building {len(tasks)} items on {workers} workers"
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_item_worker,
+            initargs=(z, _session_kwargs(sess), effective_gdal_config()),
+        )
+        scheduler = AdmissionScheduler(
+            executor, MemoryBudget(memory_budget or default_memory_budget())
+        )
+    else:
+        executor = None
+
+    def run(tasks: list):
+        if previous is None:
+            yield from build(tasks)
+            return
+
+        carried = {}
+        for kind, member, *_ in tasks:
+            item = previous.carry_forward(
+                member, z.fingerprint(kind, member), options.source_options(kind)
             )
+            if item is not None:
+                logging.info(
+                    f"process_collection | {collection_title}:{member} unchanged, carrying forward {item.id}"
+                )
+                carried[member] = carried_forward_result(kind, item)
+
+        built = build([task for task in tasks if task[1] not in carried])
+        for _, member, *_ in tasks:
+            yield carried[member] if member in carried else next(built)
+
+    def build(tasks: list):
+        if executor is None:
+            for task in tasks:
+                timer = NULL_TIMER if timings is None else timings.item(*task[:2])
+                result = item_from_member(
+                    project,
+                    z,
+                    collection_id,
+                    sess,
+                    *task,
+                    uploader=uploader,
+                    options=options,
+                    timer=timer,
+                )
+                if timings is not None:
+                    timings.add(timer.finish())
+                yield result
+            return
+
+        in_worker = partial(
+            _item_from_member_in_worker,
+            project,
+            collection_id,
+            options,
+            uploader is not None,
+            timings is not None,
+        )
+        costs = [z.memory_estimate(kind, member) for kind, member, *_ in tasks]
+        for result, uploads, timing in scheduler.map(in_worker, tasks, costs):
+            if uploads is not None:
+                uploads.replay(uploader)
+            if timings is not None:
+                timings.add(timing)
+            yield result
+
+    try:
+        for (kind, member), result in zip(tasks, run(tasks)):
+            if result is None:
+                continue
+            item, projection, _ = result
+            if projection is not None:
+                projections.append(projection)
+            _add_item(item, member, collection_title, items, bboxes, extensions)
+
+        if z.ras_models:
+            use_first_projection = projections[0]
+            ras_tasks = [("ras_model", m, use_first_projection) for m in z.ras_models]
+            for (_, model, _), result in zip(ras_tasks, run(ras_tasks)):
+                if result is None:
+                    continue
+                item, _, model_files = result
+                if _add_item(item, model, collection_title, items, bboxes, extensions):
+                    all_ras_model_files.extend(model_files)
+    finally:
+        if executor is not None:
+            # On failure, do not wait for the members still queued
+            scheduler.stop()
+            executor.shutdown(cancel_futures=True)
 
     collection_bbox = collection_bounding_boxes(bboxes)
 
@@ -1,17 +1,29 @@
 import boto3
 from dotenv import load_dotenv, find_dotenv
-import fiona
 import json
 import logging
 import os
 import pathlib as pl
 from papipyplug import plugin_logger
-import s3fs
 import uuid
 import warnings
 
+from stores.admission import default_memory_budget
+from stores.clients import fiona_session, s3_filesystem
+from stores.footprints import DEFAULT_POINT_BUDGET
+from stores.gdal_env import enter_gdal_env
+from stores.incremental import SOURCE_PROPERTY, PublishedItems
+from stores.mirror import archive_mirror
+from stores.thumbnail_cache import ThumbnailCache
+from stores.timing import TimingRecorder
+from stores.uploads import S3Uploader
 from stores.utils import verify_key
-from stores.zips import S3Zip, new_collection_from_zip
+from stores.zips import (
+    ItemOptions,
+    S3Zip,
+    new_collection_from_zip,
+    pending_members,
+)
 
 
 # warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -25,10 +37,29 @@ boto3.set_stream_logger(name="urllib3.connectionpool", level=logging.WARNING)
 
 plugin_params = {
     "required": ["project", "bucket", "key", "collection_title"],
-    "optional": [],
+    "optional": [
+        "zip_index_cache",
+        "workers",
+        "raster_footprint",
+        "point_budget",
+        "collection_id",
+        "incremental",
+        "mirror",
+        "scratch_dir",
+        "gdal_config",
+        "memory_budget",
+        "thumbnail_cache",
+        "thumbnail_cache_dir",
+        "timing",
+        "timing_export",
+    ],
 }
 
 
+def param_flag(params: dict, name: str) -> bool:
+    return str(params.get(name, False)).lower() in ["true", "1", "yes"]
+
+
 def main(params: dict) -> dict:
     try:
         load_dotenv(find_dotenv())
@@ -37,7 +68,6 @@ def main(params: dict) -> dict:
 
     plugin_logger()
 
-    item_results = []
     results = {}
     (project, bucket, key, collection_title) = (
         params["project"],
@@ -46,18 +76,6 @@ def main(params: dict) -> dict:
         params["collection_title"],
     )
 
-    sess = fiona.session.AWSSession(
-        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-    )
-
-    fs = s3fs.S3FileSystem(
-        key=os.environ["AWS_ACCESS_KEY_ID"],
-        secret=os.environ["AWS_SECRET_ACCESS_KEY"],
-    )
-
-    s3_resource = boto3.resource("s3")
-
     # TODO: Verify key exists and is accessible
     if verify_key(bucket, key):
         raise
@@ -81,29 +99,166 @@ def main(params: dict) -> dict:
 
     # Case 2: zipfile (unknown contents)
     else:
-        zfile = S3Zip(bucket, key, fs)
-        logging.info(f"zip_reader | {zfile.key}: creating collection")
-        collection_id = str(uuid.uuid4())
+        results = catalog_zip(project, bucket, key, collection_title, params)
 
-        collection = new_collection_from_zip(
-            project, zfile, collection_id, collection_title, sess
-        )
+    logging.info(f"zip_reader | {key}: processing complete!")
+    return results
+
+
+def catalog_zip(
+    project: str, bucket: str, key: str, collection_title: str, params: dict
+) -> dict:
+    """
+    Build and publish the collection for one zip archive (of unknown
+    contents). Clients come from the process-wide factory, so repeated calls
+    in one process (batch mode) share them. The member index and the
+    incremental check use ranged reads; only when members are to be rebuilt
+    is a mid-size archive mirrored to local scratch space and read from
+    there.
+
+    With `timing` the per-item stage timings (including the PUTs of their
+    thumbnail and item JSON) and their per-archive totals are returned
+    under `timings`; `timing_export` (a local directory or
+    s3:// prefix) also receives them as an OpenTelemetry trace
+    """
+    item_results = []
+    results = {}
+    sess = fiona_session()
+    fs = s3_filesystem()
+    results["gdal_config"] = enter_gdal_env(params.get("gdal_config"), sess)
+
+    zfile = S3Zip(bucket, key, fs, index_cache=params.get("zip_index_cache"))
+    logging.info(f"zip_reader | {zfile.key}: creating collection")
+    collection_id = params.get("collection_id") or str(uuid.uuid4())
 
-        for item in collection.get_items():
-            item_json = f"stac/collections/{collection_id}/{item.id}/{item.id}.json"
-            logging.info(f"zip_reader | {zfile.key}: writing  to {item_json}")
-            item_results.append(item_json)
-            logging.info(f"{item.id}:{item.datetime}")
-            s3_resource.Object(bucket, item_json).put(Body=json.dumps(item.to_dict()))
+    previous = None
+    if param_flag(params, "incremental"):
+        if "collection_id" not in params:
+            raise ValueError("incremental mode requires the `collection_id` to update")
+        previous = PublishedItems.from_s3(fs, bucket, collection_id)
 
-        collection_file = f"stac/collections/{collection_id}/collection.json"
-        results["collection"] = collection_file
+    options = ItemOptions(
+        raster_footprint=params.get("raster_footprint", "valid_data"),
+        point_budget=int(params.get("point_budget", DEFAULT_POINT_BUDGET)),
+        thumbnail_cache=ThumbnailCache.from_env(
+            bucket,
+            params.get("thumbnail_cache"),
+            params.get("thumbnail_cache_dir"),
+        ),
+    )
+
+    # Nothing to rebuild, nothing worth downloading
+    mirror_mode = params.get("mirror", "auto")
+    if not pending_members(zfile, previous, options):
+        logging.info(f"zip_reader | {zfile.key}: every item is unchanged")
+        mirror_mode = "never"
 
-        logging.info(f"zip_reader | {zfile.key}: wrting  to {collection_file}")
-        s3_resource.Object(bucket, collection_file).put(
-            Body=json.dumps(collection.to_dict())
+    with archive_mirror(fs, bucket, key, mirror_mode, params.get("scratch_dir")) as mirror:
+        results["mirrored"] = mirror is not None
+        if mirror is not None:
+            zfile.use_mirror(mirror)
+
+        memory_budget = (
+            float(params.get("memory_budget", 0)) or default_memory_budget()
         )
+        results["memory_budget"] = round(memory_budget, 3)
+
+        timings = None
+        if param_flag(params, "timing") or params.get("timing_export"):
+            timings = TimingRecorder(key)
+
+        with S3Uploader() as uploader:
+            collection = new_collection_from_zip(
+                project,
+                zfile,
+                collection_id,
+                collection_title,
+                sess,
+                workers=int(params.get("workers", 1)),
+                uploader=uploader,
+                options=options,
+                previous=previous,
+                memory_budget=memory_budget,
+                timings=timings,
+            )
+            if previous is not None:
+                results["carried_forward"] = previous.carried
+
+            for item in collection.get_items():
+                item_json = (
+                    f"stac/collections/{collection_id}/{item.id}/{item.id}.json"
+                )
+                logging.info(f"zip_reader | {zfile.key}: writing  to {item_json}")
+                item_results.append(item_json)
+                logging.info(f"{item.id}:{item.datetime}")
+                if timings is not None:
+                    source = item.properties.get(SOURCE_PROPERTY, {})
+                    timings.assign_upload(item_json, source.get("member"))
+                uploader.put(
+                    bucket, item_json, json.dumps(item.to_dict()), "application/json"
+                )
+
+            collection_file = f"stac/collections/{collection_id}/collection.json"
+            results["collection"] = collection_file
+
+            logging.info(f"zip_reader | {zfile.key}: wrting  to {collection_file}")
+            uploader.put(
+                bucket,
+                collection_file,
+                json.dumps(collection.to_dict()),
+                "application/json",
+            )
+
+            upload_results = uploader.wait()
+            results["upload_failures"] = upload_results["failed"]
+            if timings is not None:
+                timings.add_uploads(uploader.timings)
+
+        if previous is not None:
+            results["removed"] = remove_stale_items(fs, previous, zfile, collection)
 
     results["item_results"] = item_results
-    logging.info(f"zip_reader | {zfile.key}: processing complete!")
+
+    if timings is not None:
+        results["timings"] = timings.summary()
+        if params.get("timing_export"):
+            results["timing_export"] = export_trace(
+                fs, timings, params["timing_export"], collection_id
+            )
     return results
+
+
+def remove_stale_items(
+    fs, previous: PublishedItems, zfile: S3Zip, collection
+) -> list:
+    """
+    Delete the published JSON of previous items whose member is no longer
+    in the archive; the new collection already omits them
+    """
+    current = {item.id for item in collection.get_items()}
+    members = [member for _, member in zfile.item_members]
+    removed = []
+    for item_id, path in previous.stale(members).items():
+        if item_id in current or path is None:
+            continue
+        try:
+            fs.rm(path)
+            removed.append(item_id)
+            logging.info(f"zip_reader | {zfile.key}: removed stale item {path}")
+        except Exception as e:
+            logging.warning(f"zip_reader | {zfile.key}: unable to remove {path}: {e}")
+    return removed
+
+
+def export_trace(
+    fs, timings: TimingRecorder, location: str, collection_id: str
+) -> str:
+    trace_file = f"{location.rstrip('/')}/{collection_id}-trace.json"
+    trace = json.dumps(timings.to_otel())
+    if trace_file.startswith("s3://"):
+        fs.pipe(trace_file, trace.encode())
+    else:
+        pl.Path(trace_file).parent.mkdir(parents=True, exist_ok=True)
+        pl.Path(trace_file).write_text(trace)
+    logging.info(f"zip_reader | {collection_id}: stage timings written to {trace_file}")
+    return trace_file